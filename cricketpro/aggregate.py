@@ -0,0 +1,162 @@
+import pandas as pd
+from ingest import list_match_files, parse_batches, build_frames, match_dates
+from delivery_store import update_store
+from streaming import stream_aggregates
+from run_report import RunReport
+from matchups import MatchupIndex, delivery_pairs
+from rollup import build_cube, cube_parts, merge_parts, RollupCube
+from player_registry import build_registry, registry_part, merge_registry, combine_registries, PlayerRegistry
+from sharding import parse_sharded, split_frames
+
+# Per-(player, match) aggregation of the delivery tables built by ingest.py
+
+# Bowling Elo and career stats only count spells of at least two overs
+MIN_BOWLING_BALLS = 12
+
+
+def aggregate_batting(bat_df):
+    # Per-(player, match) batting totals
+    bat_df['date'] = pd.to_datetime(bat_df['date'], errors='coerce')
+    bat_df['match_id'] = match_dates(bat_df['date']) + "_" + bat_df['league'] + "_" + bat_df['team']
+    agg_bat = bat_df.groupby(['player', 'match_id']).agg(
+        runs=('runs', 'sum'),
+        balls=('balls', 'sum'),
+        league=('league', 'first'),
+        match_type=('match_type', 'first'),
+        date=('date', 'first')
+    ).reset_index()
+    return agg_bat
+
+
+def aggregate_bowling(bowl_df):
+    # Per-(player, match) bowling totals
+    bowl_df['date'] = pd.to_datetime(bowl_df['date'], errors='coerce')
+    bowl_df['match_id'] = match_dates(bowl_df['date']) + "_" + bowl_df['league'] + "_" + bowl_df['team']
+    agg_bowl = bowl_df.groupby(['player', 'match_id']).agg(
+        wickets=('wickets', 'sum'),
+        balls=('balls', 'sum'),
+        runs_conceded=('runs_conceded', 'sum'),
+        league=('league', 'first'),
+        match_type=('match_type', 'first'),
+        date=('date', 'first')
+    ).reset_index()
+    return agg_bowl
+
+
+def fielding_counts(fielding_df):
+    # Catches / run outs / stumpings per player
+    if fielding_df.empty:
+        return pd.DataFrame()
+    return fielding_df.groupby('player')['event'].value_counts().unstack(fill_value=0)
+
+
+def load_aggregates(league_folders, workers=1, store=None, stream=False, chunk_files=200, report=None,
+                    matchup_path=None, cube_path=None, registry_path=None, shards=1):
+    """Ingests the league folders and returns (agg_bat, agg_bowl, fielding_counts).
+
+    With shards > 1 the deliveries are instead returned unaggregated, hash-partitioned by
+    player into per-shard compact parts (sharding.py); the caller aggregates each shard and
+    builds its matchup, cube and registry partials there, so the paths are not used here.
+    Stream mode always aggregates.
+
+    stream aggregates in bounded memory (streaming.py); otherwise deliveries come from
+    the Parquet store in `store` when given (delivery_store.py) or straight from JSON.
+    Each step is recorded as a stage of `report` (a run_report.RunReport) when given.
+    With matchup_path, the batter-vs-bowler index (matchups.py) is built from the same
+    deliveries and saved there; with cube_path, so is the rollup cube (rollup.py), and with
+    registry_path the player registry (player_registry.py).
+    """
+    report = report if report is not None else RunReport()
+    with report.stage('list_files') as stage:
+        files = list_match_files(league_folders)
+        stage.files = len(files)
+    if stream:
+        with report.stage('stream_aggregate') as stage:
+            aggregates = stream_aggregates(files, workers=workers, chunk_files=chunk_files,
+                                           matchup_path=matchup_path, cube_path=cube_path,
+                                           registry_path=registry_path)
+            stage.files = len(files)
+            stage.rows = len(aggregates[0]) + len(aggregates[1])
+        return aggregates
+    if store:
+        with report.stage('delivery_store') as stage:
+            bat_df, bowl_df, fielding_df, people_df = update_store(league_folders, store, workers=workers)
+            stage.files = len(files)
+            stage.rows = len(bat_df) + len(bowl_df) + len(fielding_df)
+        if shards > 1:
+            with report.stage('split_shards') as stage:
+                parts = split_frames(bat_df, bowl_df, fielding_df, people_df, shards)
+                stage.rows = len(bat_df) + len(bowl_df) + len(fielding_df)
+            return parts
+    elif shards > 1:
+        with report.stage('parse_json') as stage:
+            parts = parse_sharded(files, shards, workers=workers)
+            stage.files = len(files)
+        return parts
+    else:
+        with report.stage('parse_json') as stage:
+            batches = parse_batches(files, workers=workers)
+            stage.files = len(files)
+        with report.stage('build_frames') as stage:
+            bat_df, bowl_df, fielding_df, people_df = build_frames(batches)
+            del batches
+            stage.rows = len(bat_df) + len(bowl_df) + len(fielding_df)
+    if matchup_path is not None:
+        with report.stage('matchups') as stage:
+            matchups = MatchupIndex.from_frames(bat_df, bowl_df)
+            matchups.save(matchup_path)
+            stage.rows = len(matchups)
+    if cube_path is not None:
+        with report.stage('rollup_cube') as stage:
+            cube = build_cube(bat_df, bowl_df, fielding_df)
+            cube.save(cube_path)
+            stage.rows = len(cube)
+    if registry_path is not None:
+        with report.stage('player_registry') as stage:
+            names = pd.unique(pd.concat([frame['player'] for frame in (bat_df, bowl_df, fielding_df)
+                                         if not frame.empty], ignore_index=True)) if not bat_df.empty else []
+            registry = build_registry(people_df, names)
+            registry.save(registry_path)
+            stage.rows = len(registry)
+    with report.stage('aggregate_batting') as stage:
+        agg_bat = aggregate_batting(bat_df)
+        stage.rows = len(bat_df)
+    with report.stage('aggregate_bowling') as stage:
+        agg_bowl = aggregate_bowling(bowl_df)
+        stage.rows = len(bowl_df)
+    with report.stage('aggregate_fielding') as stage:
+        fielding = fielding_counts(fielding_df)
+        stage.rows = len(fielding_df)
+    return agg_bat, agg_bowl, fielding
+
+
+def delivery_partials(bat_df, bowl_df, fielding_df, people_df):
+    """Partials of the matchup index, rollup cube and player registry from one player shard's
+    delivery tables (bat_df with its 'bowler' column); save_partials() sums them. Call before
+    aggregation rewrites the dates."""
+    return {
+        'matchups': delivery_pairs(bat_df['player'], bat_df['bowler'], bat_df['runs'], bat_df['dismissal']),
+        'cube': cube_parts(bat_df, bowl_df, fielding_df),
+        # A player's people rows (by id) and deliveries are all in its shard, so its registry rows are final
+        'registry': merge_registry([registry_part(people_df)] if not people_df.empty else [],
+                                   pd.unique(pd.concat([bat_df['player'], bowl_df['player'], fielding_df['player']])))
+    }
+
+
+def save_partials(partials, report, matchup_path=None, cube_path=None, registry_path=None):
+    # Sums the shards' delivery_partials() into the indexes load_aggregates builds serially
+    if matchup_path is not None:
+        with report.stage('matchups') as stage:
+            matchups = MatchupIndex.from_parts([part['matchups'] for part in partials])
+            matchups.save(matchup_path)
+            stage.rows = len(matchups)
+    if cube_path is not None:
+        with report.stage('rollup_cube') as stage:
+            cube = RollupCube(merge_parts([cube for part in partials for cube in part['cube']]))
+            cube.save(cube_path)
+            stage.rows = len(cube)
+    if registry_path is not None:
+        with report.stage('player_registry') as stage:
+            registry = PlayerRegistry(combine_registries([part['registry'] for part in partials]))
+            registry.save(registry_path)
+            stage.rows = len(registry)
@@ -0,0 +1,147 @@
+import os
+import json
+import argparse
+import pandas as pd
+from cricketelo import run_pipeline
+from query_api import QueryService
+from run_report import RunReport
+from synthetic_data import generate_corpus, BASE_MATCHES, BASE_PLAYERS, LEAGUES
+
+# Benchmarks the pipeline (cricketelo.py) and the dashboard's data paths (cric.py) on
+# synthetic corpora at several multiples of today's corpus size. Stages are recorded with
+# run_report.RunReport: wall and CPU time, peak RSS, rows, and the peak memory Python
+# allocated during the stage (tracemalloc, which counts pandas and numpy buffers). A scale
+# that runs out of memory is recorded with the stage it failed in.
+BENCH_DIR = 'bench_data'
+RESULTS = 'benchmark_results.json'
+
+
+def corpus(bench_dir, scale, leagues, seed):
+    # League folders of the synthetic corpus for `scale`, generated on first use
+    matches, players = int(BASE_MATCHES * scale), int(BASE_PLAYERS * scale)
+    root = os.path.join(bench_dir, f"scale_{scale:g}")
+    marker = os.path.join(root, 'corpus.json')
+    params = {'matches': matches, 'players': players, 'leagues': leagues, 'seed': seed}
+    if os.path.exists(marker):
+        with open(marker) as f:
+            saved = json.load(f)
+        if saved['params'] == params:
+            return [tuple(folder) for folder in saved['folders']]
+    print(f"Generating {matches} matches, {players} players, {leagues} leagues in {root}...")
+    folders = generate_corpus(root, **params)
+    with open(marker, 'w') as f:
+        json.dump({'params': params, 'folders': folders}, f)
+    return folders
+
+
+# --- Dashboard data paths (cric.py via query_api.QueryService) ---
+def dashboard_load(data_dir):
+    # Cold start: the outputs, Elo history indexes and registry a query service loads once
+    # per process
+    service = QueryService(data_dir)
+    for name in ['batting_stats', 'bowling_stats', 'allrounder_stats', 'elite_batters', 'elite_bowlers',
+                 'elite_allrounders', 'fielding_stats']:
+        service.output(name)
+    for kind in ['batting', 'bowling']:
+        service.history(kind)
+    service.registry()
+    return service
+
+
+def dashboard_rerun(service):
+    # Work one rerun repeats for every tab: a leaderboard page per table, three player searches
+    # and the top-20 Elo traces (uncached, as on the first view of each player)
+    service.cache.clear()
+    for kind in ['batting', 'bowling', 'allrounder']:
+        service.leaderboard(kind, elite=False)
+    matches = [service.search(query) for query in ['', 'a', 'smith']]
+    for kind, traces in [('batting', 'batting'), ('bowling', 'bowling'), ('allrounder', 'batting')]:
+        for player in service.top_players(kind):
+            service.trajectory(traces, player)
+    return sum(len(found) for found in matches)
+
+
+def run_scale(scale, args, shards):
+    league_folders = corpus(args.bench_dir, scale, args.leagues, args.seed)
+    out_dir = os.path.join(args.bench_dir, f"scale_{scale:g}_out")
+    os.makedirs(out_dir, exist_ok=True)
+    report = RunReport(trace_memory=[] if args.no_memory else ['all'])
+    print(f"Scale {scale:g}x, {shards} shard(s):")
+    result = {'scale': scale, 'shards': shards}
+    try:
+        run_pipeline(league_folders, report, out_dir, workers=args.workers, shards=shards)
+        with report.stage('dashboard_load') as stage:
+            service = dashboard_load(out_dir)
+            stage.rows = sum(len(service.history(kind).rows) for kind in ['batting', 'bowling'])
+        for _ in range(args.reruns):
+            with report.stage('dashboard_rerun') as stage:
+                stage.rows = dashboard_rerun(service)
+    except MemoryError:
+        result['failed_stage'] = report.stages[-1]['stage']
+    print(report.table())
+    if 'failed_stage' in result:
+        print(f"  out of memory in {result['failed_stage']}")
+    result.update(report.summary())
+    return result
+
+
+def scaling(results):
+    """Pipeline seconds per scale and shard count. wall_s is measured end to end and speedup
+    compares it with the first shard count's wall_s; it only shows scaling on a machine with
+    at least as many cores as shards. est_critical_s is an estimate of a run with one core per
+    shard, modelled from the measured stages: the wall time outside the sharded stage, plus the
+    parent's CPU time inside it (splitting, pickling, merging) and the slowest shard's CPU
+    time. est_speedup compares it with the first shard count's est_critical_s."""
+    rows = []
+    for r in results:
+        stages = [s for s in r['stages'] if not s['stage'].startswith('dashboard')]
+        wall = sum(s.get('wall_seconds', 0) for s in stages)
+        sharded = [s for s in stages if 'shards' in s]
+        critical = wall
+        for s in sharded:
+            critical += s['cpu_seconds'] + max(shard['cpu_seconds'] for shard in s['shards']) - s['wall_seconds']
+        rows.append({'scale': f"{r['scale']:g}x", 'shards': r['shards'], 'wall_s': wall, 'est_critical_s': critical,
+                     'slowest_shard_s': max((max(shard['cpu_seconds'] for shard in s['shards']) for s in sharded),
+                                            default=None)})
+    table = pd.DataFrame(rows)
+    by_scale = table.groupby('scale')
+    table['speedup'] = by_scale['wall_s'].transform('first') / table['wall_s']
+    table['est_speedup'] = by_scale['est_critical_s'].transform('first') / table['est_critical_s']
+    return table[['scale', 'shards', 'wall_s', 'speedup', 'est_critical_s', 'est_speedup', 'slowest_shard_s']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages and dashboard data paths on synthetic data.")
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100],
+                        help=f"Corpus sizes as multiples of {BASE_MATCHES} matches / {BASE_PLAYERS} players")
+    parser.add_argument('--leagues', type=int, default=len(LEAGUES), help="Number of synthetic leagues")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1, help="Processes for the ingestion stage")
+    parser.add_argument('--shards', type=int, default=1, help="Player shards (processes) for aggregation and Elo")
+    parser.add_argument('--shard-counts', type=int, nargs='+', metavar='N',
+                        help="Run every scale once per shard count and print the scaling curve (instead of --shards)")
+    parser.add_argument('--reruns', type=int, default=3, help="Dashboard reruns timed per scale")
+    parser.add_argument('--bench-dir', default=BENCH_DIR, help="Where corpora and outputs are kept")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="Skip tracemalloc (its bookkeeping slows allocation-heavy stages)")
+    parser.add_argument('--out', default=RESULTS, help="JSON results file")
+    args = parser.parse_args()
+
+    counts = args.shard_counts or [args.shards]
+    results = [run_scale(scale, args, shards) for scale in args.scales for shards in counts]
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    label = (lambda r: f"{r['scale']:g}x") if len(counts) == 1 else (lambda r: f"{r['scale']:g}x/{r['shards']}")
+    summary = pd.DataFrame({label(r): {s['stage']: s.get('wall_seconds') for s in r['stages']} for r in results})
+    print(summary.to_string())
+    if args.shard_counts:
+        print(scaling(results).to_string(index=False, float_format=lambda value: f"{value:.2f}"))
+        cores = os.cpu_count() or 1
+        if cores < max(args.shard_counts):
+            print(f"Only {cores} core(s): shards share cores, so wall_s / speedup cannot show scaling "
+                  "beyond that; est_* columns are modelled, not measured.")
+    print(f"Results written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,216 +1,239 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import os
-
-st.set_page_config(page_title="T20 Player Elo Analytics Dashboard", layout="wide")
-st.title("T20 Player Elo Analytics Dashboard")
-
-@st.cache_data
-def load_csv(name):
-    if not os.path.exists(name):
-        st.error(f"File '{name}' not found. Please run the pipeline first.")
-        st.stop()
-    return pd.read_csv(name, index_col=0)
-
-with st.spinner("Loading data..."):
-    batting = load_csv('cricketpro/batting_stats.csv')
-bowling = load_csv('cricketpro/bowling_stats.csv')
-allrounders = load_csv('cricketpro/allrounder_stats.csv')
-elite_batters = load_csv('cricketpro/elite_batters.csv')
-elite_bowlers = load_csv('cricketpro/elite_bowlers.csv')
-elite_allrounders = load_csv('cricketpro/elite_allrounders.csv')
-elo_batting_hist = pd.read_csv('cricketpro/elo_history_batting.csv')
-elo_bowling_hist = pd.read_csv('cricketpro/elo_history_bowling.csv')
-fielding_stats = load_csv('cricketpro/fielding_stats.csv')
-
-
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-    "Batters", "Bowlers", "All-Rounders", "Player Details", "Compare Players", "Top 20 Elo Progression"
-])
-
-with tab1:
-    st.header("Batters")
-    show_elite = st.checkbox("Show only elite batters", value=True, key="elite_batters")
-    data = elite_batters if show_elite else batting
-    cols = ['batting_elo', 'total_runs', 'matches_played', 'bat_avg', 'strike_rate', 'milestone_1000_runs']
-    available_cols = [col for col in cols if col in data.columns]
-    st.dataframe(
-        data.sort_values('batting_elo', ascending=False)[available_cols].head(50 if show_elite else 100),
-        use_container_width=True
-    )
-    st.download_button(
-        label="Download Batting Data as CSV",
-        data=data.to_csv().encode('utf-8'),
-        file_name='batting_stats.csv',
-        mime='text/csv'
-    )
-    st.plotly_chart(px.histogram(data, x="batting_elo", nbins=30, title="Batting Elo Distribution"), use_container_width=True, key="bat_hist")
-    st.plotly_chart(px.scatter(data, x="batting_elo", y="strike_rate", hover_name=data.index, title="Batting Elo vs Strike Rate"), use_container_width=True, key="bat_scatter")
-
-with tab2:
-    st.header("Bowlers")
-    show_elite = st.checkbox("Show only elite bowlers", value=True, key="elite_bowlers")
-    data = elite_bowlers if show_elite else bowling
-    cols = ['bowling_elo', 'total_wickets', 'matches_2plus_overs', 'bowling_avg', 'economy', 'wickets_per_match', 'milestone_100_wickets']
-    available_cols = [col for col in cols if col in data.columns]
-    st.dataframe(
-        data.sort_values('bowling_elo', ascending=False)[available_cols].head(50 if show_elite else 100),
-        use_container_width=True
-    )
-    st.download_button(
-        label="Download Bowling Data as CSV",
-        data=data.to_csv().encode('utf-8'),
-        file_name='bowling_stats.csv',
-        mime='text/csv'
-    )
-    st.plotly_chart(px.histogram(data, x="bowling_elo", nbins=30, title="Bowling Elo Distribution"), use_container_width=True, key="bowl_hist")
-    st.plotly_chart(px.scatter(data, x="bowling_elo", y="economy", hover_name=data.index, title="Bowling Elo vs Economy"), use_container_width=True, key="bowl_scatter")
-
-with tab3:
-    st.header("All-Rounders")
-    show_elite = st.checkbox("Show only elite all-rounders", value=True, key="elite_allrounders")
-    data = elite_allrounders if show_elite else allrounders
-    cols = ['allrounder_elo', 'batting_elo', 'bowling_elo', 'total_runs', 'total_wickets', 'matches_played', 'matches_2plus_overs']
-    available_cols = [col for col in cols if col in data.columns]
-    st.dataframe(
-        data.sort_values('allrounder_elo', ascending=False)[available_cols].head(50 if show_elite else 100),
-        use_container_width=True
-    )
-    st.download_button(
-        label="Download All-Rounder Data as CSV",
-        data=data.to_csv().encode('utf-8'),
-        file_name='allrounder_stats.csv',
-        mime='text/csv'
-    )
-    st.plotly_chart(px.histogram(data, x="allrounder_elo", nbins=30, title="All-Rounder Elo Distribution"), use_container_width=True, key="ar_hist")
-
-with tab4:
-    st.header("Player Details & Career Graphs")
-    all_players = sorted(set(batting.index) | set(bowling.index))
-    player = st.selectbox("Search for a player", all_players, key="player_details_search")
-
-    st.subheader(f"Batting Stats for {player}")
-    if player in batting.index:
-        st.table(batting.loc[[player]][['batting_elo', 'total_runs', 'matches_played', 'bat_avg', 'strike_rate', 'milestone_1000_runs']])
-    else:
-        st.info("No batting stats available.")
-
-    st.subheader(f"Bowling Stats for {player}")
-    if player in bowling.index:
-        st.table(bowling.loc[[player]][['bowling_elo', 'total_wickets', 'matches_2plus_overs', 'bowling_avg', 'economy', 'wickets_per_match', 'milestone_100_wickets']])
-    else:
-        st.info("No bowling stats available.")
-
-    st.subheader(f"Fielding Stats for {player}")
-    if player in fielding_stats.index:
-        stats = fielding_stats.loc[[player]]
-        stats = stats.loc[:, (stats != 0).any(axis=0)]
-        st.table(stats)
-    else:
-        st.info("No fielding stats available.")
-
-    st.subheader(f"Batting Elo Progression for {player}")
-    if 'batter' in elo_batting_hist.columns and player in elo_batting_hist['batter'].values:
-        df_bat = elo_batting_hist[elo_batting_hist['batter'] == player]
-        if not df_bat.empty:
-            st.plotly_chart(
-                px.line(df_bat, x="date", y="batting_elo", title=f"{player} - Batting Elo Over Time"),
-                use_container_width=True,
-                key=f"bat_elo_{player}"
-            )
-        else:
-            st.info("No Batting Elo history available for this player.")
-    else:
-        st.info("No Batting Elo history available for this player.")
-
-    st.subheader(f"Bowling Elo Progression for {player}")
-    if 'bowler' in elo_bowling_hist.columns and player in elo_bowling_hist['bowler'].values:
-        df_bowl = elo_bowling_hist[elo_bowling_hist['bowler'] == player]
-        if not df_bowl.empty:
-            st.plotly_chart(
-                px.line(df_bowl, x="date", y="bowling_elo", title=f"{player} - Bowling Elo Over Time"),
-                use_container_width=True,
-                key=f"bowl_elo_{player}"
-            )
-        else:
-            st.info("No Bowling Elo history available for this player.")
-    else:
-        st.info("No Bowling Elo history available for this player.")
-
-with tab5:
-    st.header("Compare Two Players")
-    all_players = sorted(set(batting.index) | set(bowling.index))
-    player1 = st.selectbox("Player 1", all_players, key="p1")
-    player2 = st.selectbox("Player 2", all_players, key="p2")
-    st.subheader(f"Comparison: {player1} vs {player2}")
-
-    stats = []
-    for player in [player1, player2]:
-        bat = batting.loc[player] if player in batting.index else None
-        bowl = bowling.loc[player] if player in bowling.index else None
-        stats.append({
-            "Batting Elo": bat['batting_elo'] if bat is not None else None,
-            "Total Runs": bat['total_runs'] if bat is not None else None,
-            "Bat Avg": bat['bat_avg'] if bat is not None else None,
-            "Strike Rate": bat['strike_rate'] if bat is not None else None,
-            "Bowling Elo": bowl['bowling_elo'] if bowl is not None else None,
-            "Total Wickets": bowl['total_wickets'] if bowl is not None else None,
-            "Bowling Avg": bowl['bowling_avg'] if bowl is not None else None,
-            "Economy": bowl['economy'] if bowl is not None else None
-        })
-    st.dataframe(pd.DataFrame(stats, index=[player1, player2]))
-
-    st.subheader("Batting Elo Progression Comparison")
-    fig = go.Figure()
-    for idx, player in enumerate([player1, player2]):
-        if 'batter' in elo_batting_hist.columns and player in elo_batting_hist['batter'].values:
-            df = elo_batting_hist[elo_batting_hist['batter'] == player]
-            fig.add_trace(go.Scatter(x=df['date'], y=df['batting_elo'], mode='lines', name=player))
-    fig.update_layout(title="Batting Elo Progression", xaxis_title="Date", yaxis_title="Batting Elo")
-    st.plotly_chart(fig, use_container_width=True, key="bat_compare")
-
-    st.subheader("Bowling Elo Progression Comparison")
-    fig = go.Figure()
-    for idx, player in enumerate([player1, player2]):
-        if 'bowler' in elo_bowling_hist.columns and player in elo_bowling_hist['bowler'].values:
-            df = elo_bowling_hist[elo_bowling_hist['bowler'] == player]
-            fig.add_trace(go.Scatter(x=df['date'], y=df['bowling_elo'], mode='lines', name=player))
-    fig.update_layout(title="Bowling Elo Progression", xaxis_title="Date", yaxis_title="Bowling Elo")
-    st.plotly_chart(fig, use_container_width=True, key="bowl_compare")
-
-with tab6:
-    st.header("Top 20 Elo Progression")
-    st.subheader("Batters: Elo Progression for Top 20")
-    top20_batters = batting.sort_values('batting_elo', ascending=False).head(20).index
-    fig = go.Figure()
-    for player in top20_batters:
-        if 'batter' in elo_batting_hist.columns and player in elo_batting_hist['batter'].values:
-            df = elo_batting_hist[elo_batting_hist['batter'] == player]
-            fig.add_trace(go.Scatter(x=df['date'], y=df['batting_elo'], mode='lines', name=player))
-    fig.update_layout(title="Top 20 Batters - Batting Elo Progression", xaxis_title="Date", yaxis_title="Batting Elo")
-    st.plotly_chart(fig, use_container_width=True, key="top20_bat")
-
-    st.subheader("Bowlers: Elo Progression for Top 20")
-    top20_bowlers = bowling.sort_values('bowling_elo', ascending=False).head(20).index
-    fig = go.Figure()
-    for player in top20_bowlers:
-        if 'bowler' in elo_bowling_hist.columns and player in elo_bowling_hist['bowler'].values:
-            df = elo_bowling_hist[elo_bowling_hist['bowler'] == player]
-            fig.add_trace(go.Scatter(x=df['date'], y=df['bowling_elo'], mode='lines', name=player))
-    fig.update_layout(title="Top 20 Bowlers - Bowling Elo Progression", xaxis_title="Date", yaxis_title="Bowling Elo")
-    st.plotly_chart(fig, use_container_width=True, key="top20_bowl")
-
-    st.subheader("All-Rounders: Elo Progression for Top 20")
-    top20_ars = allrounders.sort_values('allrounder_elo', ascending=False).head(20).index
-    fig = go.Figure()
-    for player in top20_ars:
-        if 'batter' in elo_batting_hist.columns and player in elo_batting_hist['batter'].values:
-            df = elo_batting_hist[elo_batting_hist['batter'] == player]
-            fig.add_trace(go.Scatter(x=df['date'], y=df['batting_elo'], mode='lines', name=player))
-    fig.update_layout(title="Top 20 All-Rounders - Batting Elo Progression", xaxis_title="Date", yaxis_title="Batting Elo")
-    st.plotly_chart(fig, use_container_width=True, key="top20_ar")
-
-st.markdown("---")
-st.markdown("**Powered by Streamlit & Plotly | Research-backed T20 analytics**")
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import os
+from functools import partial
+from snapshot import EXPORT_FORMATS
+from downsample import POINTS_PER_TRACE
+from query_api import QueryService
+from query_server import QueryClient
+
+st.set_page_config(page_title="T20 Player Elo Analytics Dashboard", layout="wide")
+st.title("T20 Player Elo Analytics Dashboard")
+
+DATA_DIR = 'cricketpro'
+# URL of a running query_server.py (e.g. http://127.0.0.1:8765); unset, queries run in this process
+API_URL = os.environ.get('CRICKETPRO_API')
+
+# The dashboard only renders: every table, search and chart series comes from the query
+# service (query_api.py), which loads the outputs once and caches results for all sessions.
+@st.cache_resource
+def query_api():
+    return QueryClient(API_URL) if API_URL else QueryService(DATA_DIR)
+
+def fetch(method, *args, **kwargs):
+    try:
+        return getattr(query_api(), method)(*args, **kwargs)
+    except FileNotFoundError as exc:
+        st.error(f"'{exc}' not found. Please run the pipeline first.")
+        st.stop()
+
+def export_button(name, label, key):
+    fmt = st.selectbox("Export format", list(EXPORT_FORMATS), key=f"{key}_format")
+    extension, mime = EXPORT_FORMATS[fmt]
+    # data is a callable, so nothing is serialized unless the button is clicked
+    st.download_button(label=label, data=partial(fetch, 'export', name, fmt), file_name=f"{name}.{extension}",
+                       mime=mime, key=key, on_click='ignore')
+
+def leaderboard(kind, elite, key):
+    # League / season / phase filters take precedence over the as-of date; with neither set
+    # the career table applies. Only the selected page is fetched and sent to the browser.
+    filters = slice_filters(key)
+    as_of = as_of_slider(kind, f"{key}_as_of") if not filters else None
+    page_size = 50 if elite else 100
+    query = partial(fetch, 'leaderboard', kind, elite=elite, page_size=page_size, as_of=as_of, **filters)
+    result = query(page=1)
+    total = result['total']
+    pages = max(1, -(-total // page_size))
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"{key}_page") if pages > 1 else 1
+    if page > 1:
+        result = query(page=page)
+    start = (page - 1) * page_size
+    st.dataframe(result['rows'], use_container_width=True)
+    st.caption(f"Rows {min(start + 1, total)}-{start + len(result['rows'])} of {total}")
+
+def slice_filters(key):
+    # League / season / phase filters; empty when none is set or there is no rollup cube
+    options = fetch('slice_options')
+    if options is None:
+        return {}
+    league_col, season_col, phase_col = st.columns(3)
+    filters = {
+        'leagues': league_col.multiselect("League", options['leagues'], key=f"{key}_league"),
+        'seasons': season_col.multiselect("Season", options['seasons'], key=f"{key}_season"),
+        'phases': phase_col.multiselect("Phase", options['phases'], key=f"{key}_phase")
+    }
+    return {name: values for name, values in filters.items() if values}
+
+def player_search(label, key, default=0):
+    # Returns (player key, registry row) of the chosen player; only the top matches of the
+    # typed query are offered, never the full player list
+    query = st.text_input(label, key=f"{key}_query", placeholder="Type part of a name")
+    matches = fetch('search', query)
+    if matches.empty:
+        st.caption("No players match; showing the most-played players.")
+        matches = fetch('search', '')
+    rows = matches.index.tolist()
+    # `default` picks a different most-played player per widget until something is typed
+    index = min(default, len(rows) - 1) if not query.strip() else 0
+    row = st.selectbox("Matching players", rows, index=index, format_func=matches['label'].get, key=key)
+    entry = matches.loc[row]
+    return entry['player_id'] or entry['player'], entry
+
+def as_of_slider(kind, key):
+    # Leaderboard date; None when it is the latest date (the career tables apply)
+    date_range = fetch('rating_range', kind)
+    if date_range is None:
+        return None
+    first, last = [pd.Timestamp(date).date() for date in date_range]
+    as_of = st.slider("Ratings as of", min_value=first, max_value=last, value=last, key=key, format="YYYY-MM-DD")
+    return None if as_of >= last else as_of
+
+def trajectory(kind, player):
+    return fetch('trajectory', kind, player, full_resolution)
+
+def progression(kind, players, title, elo_col, key):
+    # One Elo line per player (key) with a history
+    fig = go.Figure()
+    for player, name in zip(players, fetch('names', players)):
+        df = trajectory(kind, player)
+        if not df.empty:
+            fig.add_trace(go.Scatter(x=df['date'], y=df[elo_col], mode='lines', name=name))
+    label = elo_col.replace('_elo', '').capitalize() + " Elo"
+    fig.update_layout(title=title, xaxis_title="Date", yaxis_title=label)
+    st.plotly_chart(fig, use_container_width=True, key=key)
+
+full_resolution = st.sidebar.checkbox(
+    "Full-resolution Elo charts", value=False,
+    help=f"Charts show at most {POINTS_PER_TRACE} points per player unless this is ticked."
+)
+
+
+tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
+    "Batters", "Bowlers", "All-Rounders", "Player Details", "Compare Players", "Top 20 Elo Progression"
+])
+
+with tab1:
+    st.header("Batters")
+    show_elite = st.checkbox("Show only elite batters", value=True, key="elite_batters")
+    table_name = 'elite_batters' if show_elite else 'batting_stats'
+    leaderboard('batting', show_elite, "bat")
+    export_button(table_name, "Download Batting Data", "bat_export")
+    data = fetch('table', table_name, ['name', 'batting_elo', 'strike_rate'])
+    st.plotly_chart(px.histogram(data, x="batting_elo", nbins=30, title="Batting Elo Distribution"), use_container_width=True, key="bat_hist")
+    st.plotly_chart(px.scatter(data, x="batting_elo", y="strike_rate", hover_name="name", title="Batting Elo vs Strike Rate"), use_container_width=True, key="bat_scatter")
+
+with tab2:
+    st.header("Bowlers")
+    show_elite = st.checkbox("Show only elite bowlers", value=True, key="elite_bowlers")
+    table_name = 'elite_bowlers' if show_elite else 'bowling_stats'
+    leaderboard('bowling', show_elite, "bowl")
+    export_button(table_name, "Download Bowling Data", "bowl_export")
+    data = fetch('table', table_name, ['name', 'bowling_elo', 'economy'])
+    st.plotly_chart(px.histogram(data, x="bowling_elo", nbins=30, title="Bowling Elo Distribution"), use_container_width=True, key="bowl_hist")
+    st.plotly_chart(px.scatter(data, x="bowling_elo", y="economy", hover_name="name", title="Bowling Elo vs Economy"), use_container_width=True, key="bowl_scatter")
+
+with tab3:
+    st.header("All-Rounders")
+    show_elite = st.checkbox("Show only elite all-rounders", value=True, key="elite_allrounders")
+    table_name = 'elite_allrounders' if show_elite else 'allrounder_stats'
+    leaderboard('allrounder', show_elite, "ar")
+    export_button(table_name, "Download All-Rounder Data", "ar_export")
+    data = fetch('table', table_name, ['allrounder_elo'])
+    st.plotly_chart(px.histogram(data, x="allrounder_elo", nbins=30, title="All-Rounder Elo Distribution"), use_container_width=True, key="ar_hist")
+
+with tab4:
+    st.header("Player Details & Career Graphs")
+    key, entry = player_search("Search for a player", "player_details_search")
+    profile = fetch('player', key)
+    player = entry['player']
+    if entry['player_id']:
+        also = [name for name in [profile['name'], *profile['also']] if name != player]
+        st.caption(f"Cricsheet id {entry['player_id']} | {entry['leagues']} | {entry['matches']} matches"
+                   + (f" | also listed as {', '.join(also)}" if also else ""))
+    shared = profile['shared_ids']
+    if len(shared) > 1:
+        st.info(f"{len(shared)} different players appear as '{profile['name']}' ({', '.join(shared)}); "
+                f"the stats below are for {key} only.")
+
+    st.subheader(f"Batting Stats for {player}")
+    if profile['batting'] is not None:
+        st.table(profile['batting'])
+    else:
+        st.info("No batting stats available.")
+
+    st.subheader(f"Bowling Stats for {player}")
+    if profile['bowling'] is not None:
+        st.table(profile['bowling'])
+    else:
+        st.info("No bowling stats available.")
+
+    st.subheader(f"Fielding Stats for {player}")
+    if profile['fielding'] is not None:
+        st.table(profile['fielding'])
+    else:
+        st.info("No fielding stats available.")
+
+    st.subheader(f"Batting Elo Progression for {player}")
+    df_bat = trajectory('batting', key)
+    if not df_bat.empty:
+        st.plotly_chart(
+            px.line(df_bat, x="date", y="batting_elo", title=f"{player} - Batting Elo Over Time"),
+            use_container_width=True,
+            key=f"bat_elo_{key}"
+        )
+    else:
+        st.info("No Batting Elo history available for this player.")
+
+    st.subheader(f"Bowling Elo Progression for {player}")
+    df_bowl = trajectory('bowling', key)
+    if not df_bowl.empty:
+        st.plotly_chart(
+            px.line(df_bowl, x="date", y="bowling_elo", title=f"{player} - Bowling Elo Over Time"),
+            use_container_width=True,
+            key=f"bowl_elo_{key}"
+        )
+    else:
+        st.info("No Bowling Elo history available for this player.")
+
+with tab5:
+    st.header("Compare Two Players")
+    player1, entry1 = player_search("Player 1", "p1")
+    player2, entry2 = player_search("Player 2", "p2", default=1)
+    name1, name2 = entry1['player'], entry2['player']
+    st.subheader(f"Comparison: {name1} vs {name2}")
+    comparison = fetch('compare', player1, player2)
+    st.dataframe(comparison['stats'])
+
+    st.subheader("Head to Head")
+    h2h = comparison['head_to_head']
+    if h2h is None:
+        st.info("No matchup index found. Re-run the pipeline to build it.")
+    elif not h2h.empty:
+        st.dataframe(h2h, use_container_width=True)
+    else:
+        st.info(f"{name1} and {name2} have not faced each other.")
+
+    st.subheader("Batting Elo Progression Comparison")
+    progression('batting', [player1, player2], "Batting Elo Progression", 'batting_elo', "bat_compare")
+
+    st.subheader("Bowling Elo Progression Comparison")
+    progression('bowling', [player1, player2], "Bowling Elo Progression", 'bowling_elo', "bowl_compare")
+
+with tab6:
+    st.header("Top 20 Elo Progression")
+    st.subheader("Batters: Elo Progression for Top 20")
+    progression('batting', fetch('top_players', 'batting'), "Top 20 Batters - Batting Elo Progression",
+                'batting_elo', "top20_bat")
+
+    st.subheader("Bowlers: Elo Progression for Top 20")
+    progression('bowling', fetch('top_players', 'bowling'), "Top 20 Bowlers - Bowling Elo Progression",
+                'bowling_elo', "top20_bowl")
+
+    st.subheader("All-Rounders: Elo Progression for Top 20")
+    progression('batting', fetch('top_players', 'allrounder'), "Top 20 All-Rounders - Batting Elo Progression",
+                'batting_elo', "top20_ar")
+
+st.markdown("---")
+st.markdown("**Powered by Streamlit & Plotly | Research-backed T20 analytics**")
@@ -1,7 +1,18 @@
 import os
-import json
+import argparse
 import pandas as pd
 import numpy as np
+from aggregate import (load_aggregates, aggregate_batting, aggregate_bowling, fielding_counts, delivery_partials,
+                       save_partials, MIN_BOWLING_BALLS)
+from snapshot import write_snapshot, SNAPSHOT_DIR
+from elo_engine import batting_result, bowling_result, elo_history, final_ratings
+from elo_checkpoints import write_checkpoints, CHECKPOINT_DIR
+from elite import elite_tables, allrounder_elo
+from run_report import RunReport, REPORT, PROFILE_DIR
+from matchups import MATCHUPS
+from rollup import CUBE
+from player_registry import REGISTRY, display_names
+from sharding import run_sharded, map_shards, delivery_frames, merge_frames, merge_counts
 
 # --- Step 1: Set up your folders (adjust as needed, use forward slashes for Windows) ---
 league_folders = [
@@ -15,245 +26,255 @@ league_folders = [
     ('C:/Users/Yojit/Downloads/t20i_male_json', 'T20I')
 ]
 
-def extract_fielder_names(fielders):
-    # Handles list of dicts (with "name") or list of strings
-    names = []
-    if isinstance(fielders, list):
-        for f in fielders:
-            if isinstance(f, dict) and "name" in f:
-                names.append(f["name"])
-            elif isinstance(f, str):
-                names.append(f)
-    elif isinstance(fielders, dict) and "name" in fielders:
-        names.append(fielders["name"])
-    return names
-
-bat_rows, bowl_rows, fielding_rows = [], [], []
-
-for folder, league in league_folders:
-    if os.path.exists(folder):
-        for fname in os.listdir(folder):
-            if fname.endswith('.json'):
-                file_path = os.path.join(folder, fname)
-                with open(file_path, 'r') as f:
-                    match = json.load(f)
-                info = match.get('info', {})
-                date = info.get('dates', [''])[0] if isinstance(info.get('dates', []), list) else info.get('dates', '')
-                match_type = info.get('match_type', 'T20')
-                innings = match.get('innings', [])
-                for inning in innings:
-                    team = inning.get('team', '')
-                    overs = inning.get('overs', [])
-                    for over in overs:
-                        for delivery in over.get('deliveries', []):
-                            # Batting
-                            batter = delivery.get('batter', '')
-                            runs = delivery.get('runs', {}).get('batter', 0)
-                            bat_rows.append({
-                                'player': batter,
-                                'team': team,
-                                'league': league,
-                                'date': date,
-                                'runs': runs,
-                                'balls': 1,
-                                'match_type': match_type
-                            })
-                            # Bowling
-                            bowler = delivery.get('bowler', '')
-                            runs_conceded = delivery.get('runs', {}).get('total', 0)
-                            wicket = 1 if 'wickets' in delivery else 0
-                            bowl_rows.append({
-                                'player': bowler,
-                                'team': team,
-                                'league': league,
-                                'date': date,
-                                'runs_conceded': runs_conceded,
-                                'balls': 1,
-                                'wickets': wicket,
-                                'match_type': match_type
-                            })
-                            # Fielding
-                            if 'wickets' in delivery:
-                                for wicket_info in delivery['wickets']:
-                                    kind = wicket_info.get('kind', '')
-                                    fielders = wicket_info.get('fielders', [])
-                                    fielder_names = extract_fielder_names(fielders)
-                                    if kind == 'caught':
-                                        for fielder_name in fielder_names:
-                                            if fielder_name:
-                                                fielding_rows.append({
-                                                    'player': fielder_name,
-                                                    'event': 'catch',
-                                                    'date': date,
-                                                    'league': league
-                                                })
-                                    elif kind == 'run out':
-                                        for fielder_name in fielder_names:
-                                            if fielder_name:
-                                                fielding_rows.append({
-                                                    'player': fielder_name,
-                                                    'event': 'run_out',
-                                                    'date': date,
-                                                    'league': league
-                                                })
-                                    elif kind == 'stumped':
-                                        for fielder_name in fielder_names:
-                                            if fielder_name:
-                                                fielding_rows.append({
-                                                    'player': fielder_name,
-                                                    'event': 'stumping',
-                                                    'date': date,
-                                                    'league': league
-                                                })
-
-# --- Batting aggregation ---
-bat_df = pd.DataFrame(bat_rows)
-bat_df['date'] = pd.to_datetime(bat_df['date'], errors='coerce')
-bat_df['match_id'] = bat_df['date'].astype(str) + "_" + bat_df['league'] + "_" + bat_df['team']
-agg_bat = bat_df.groupby(['player', 'match_id']).agg(
-    runs=('runs', 'sum'),
-    balls=('balls', 'sum'),
-    league=('league', 'first'),
-    match_type=('match_type', 'first'),
-    date=('date', 'first')
-).reset_index()
-career_bat = agg_bat.groupby('player').agg(
-    total_runs=('runs', 'sum'),
-    total_balls=('balls', 'sum'),
-    matches_played=('match_id', 'nunique')
-)
-career_bat['bat_avg'] = career_bat['total_runs'] / career_bat['matches_played']
-career_bat['strike_rate'] = (career_bat['total_runs'] / career_bat['total_balls']) * 100
-career_bat['milestone_1000_runs'] = career_bat['total_runs'] >= 1000
-
-# --- Batting Elo ---
-K_base = 10
-elo_batting = {player: 1500 for player in career_bat.index}
-elo_history = []
-for idx, row in agg_bat.iterrows():
-    batter = row['player']
-    runs = row['runs']
-    K = K_base
-    batter_result = np.log1p(runs) / np.log1p(30)
-    if runs >= 150:
-        batter_result += 0.15
-    elif runs >= 50:
-        batter_result += 0.05
-    batter_result = min(batter_result, 1.0)
-    old_bat_elo = elo_batting.get(batter, 1500)
-    expected_bat = 0.5
-    elo_batting[batter] = old_bat_elo + K * (batter_result - expected_bat)
-    elo_history.append({
-        'date': row['date'],
-        'batter': batter,
-        'batting_elo': elo_batting[batter],
-        'league': row['league']
-    })
-elo_df = pd.DataFrame(elo_history)
-elo_df['date'] = pd.to_datetime(elo_df['date'], errors='coerce')
-final_batting_elo = elo_df.groupby('batter')['batting_elo'].last()
-career_bat['batting_elo'] = final_batting_elo
-
-career_bat.to_csv('batting_stats.csv')
-elo_df.to_csv('elo_history_batting.csv', index=False)
-
-# --- Bowling aggregation ---
-bowl_df = pd.DataFrame(bowl_rows)
-bowl_df['date'] = pd.to_datetime(bowl_df['date'], errors='coerce')
-bowl_df['match_id'] = bowl_df['date'].astype(str) + "_" + bowl_df['league'] + "_" + bowl_df['team']
-agg_bowl = bowl_df.groupby(['player', 'match_id']).agg(
-    wickets=('wickets', 'sum'),
-    balls=('balls', 'sum'),
-    runs_conceded=('runs_conceded', 'sum'),
-    league=('league', 'first'),
-    match_type=('match_type', 'first'),
-    date=('date', 'first')
-).reset_index()
-agg_bowl = agg_bowl[agg_bowl['balls'] >= 12]
-career_bowl = agg_bowl.groupby('player').agg(
-    matches_2plus_overs=('match_id', 'nunique'),
-    total_wickets=('wickets', 'sum'),
-    total_balls=('balls', 'sum'),
-    total_runs=('runs_conceded', 'sum')
-)
-career_bowl['bowling_avg'] = career_bowl['total_runs'] / career_bowl['total_wickets'].replace(0, np.nan)
-career_bowl['economy'] = career_bowl['total_runs'] / (career_bowl['total_balls'] / 6).replace(0, np.nan)
-career_bowl['wickets_per_match'] = career_bowl['total_wickets'] / career_bowl['matches_2plus_overs']
-career_bowl['milestone_100_wickets'] = career_bowl['total_wickets'] >= 100
-
-# --- Bowling Elo ---
-K_base = 10
-elo_bowling = {player: 1500 for player in career_bowl.index}
-elo_bowl_history = []
-for idx, row in agg_bowl.iterrows():
-    bowler = row['player']
-    wickets = row['wickets']
-    balls = row['balls']
-    runs = row['runs_conceded']
-    K = K_base
-    economy = (runs / (balls / 6)) if balls > 0 else 8
-    result = (wickets / 2) - ((economy - 7.5) / 7.5) * 0.25
-    result = max(0, min(1, result))
-    old_elo = elo_bowling.get(bowler, 1500)
-    expected = 0.5
-    elo_bowling[bowler] = old_elo + K * (result - expected)
-    elo_bowl_history.append({
-        'date': row['date'],
-        'bowler': bowler,
-        'bowling_elo': elo_bowling[bowler],
-        'league': row['league']
-    })
-elo_bowl_df = pd.DataFrame(elo_bowl_history)
-elo_bowl_df['date'] = pd.to_datetime(elo_bowl_df['date'], errors='coerce')
-final_bowling_elo = elo_bowl_df.groupby('bowler')['bowling_elo'].last()
-career_bowl['bowling_elo'] = final_bowling_elo
-
-career_bowl.to_csv('bowling_stats.csv')
-elo_bowl_df.to_csv('elo_history_bowling.csv', index=False)
-
-# --- All-rounders ---
-allrounder_df = career_bat[['batting_elo', 'total_runs', 'matches_played']].merge(
-    career_bowl[['bowling_elo', 'total_wickets', 'matches_2plus_overs']],
-    left_index=True, right_index=True, how='inner'
-)
-allrounder_df = allrounder_df[
-    (allrounder_df['total_runs'] >= 500) &
-    (allrounder_df['total_wickets'] >= 30) &
-    (allrounder_df['matches_played'] >= 20) &
-    (allrounder_df['matches_2plus_overs'] >= 20)
-]
-allrounder_df['allrounder_elo'] = np.sqrt(allrounder_df['batting_elo'] * allrounder_df['bowling_elo'])
-allrounder_df.to_csv('allrounder_stats.csv')
-
-# --- Fielding stats ---
-fielding_df = pd.DataFrame(fielding_rows)
-if not fielding_df.empty:
-    fielding_stats = fielding_df.groupby('player')['event'].value_counts().unstack(fill_value=0)
-    fielding_stats['total_fielding'] = fielding_stats.sum(axis=1)
-    fielding_stats.to_csv('fielding_stats.csv')
-else:
-    pd.DataFrame().to_csv('fielding_stats.csv')  # Empty if no data
-
-# --- Elite filtering (top 10%) ---
-min_matches = 20
-elite_batters = career_bat[career_bat['matches_played'] >= min_matches]
-bat_thresh = elite_batters['batting_elo'].quantile(0.90)
-elite_batters = elite_batters[elite_batters['batting_elo'] >= bat_thresh]
-elite_batters.to_csv('elite_batters.csv')
-
-elite_bowlers = career_bowl[
-    (career_bowl['matches_2plus_overs'] >= 30) &
-    (career_bowl['total_wickets'] >= 100) &
-    (career_bowl['wickets_per_match'] >= 0.8) &
-    (career_bowl['bowling_avg'] < 35) &
-    (career_bowl['economy'] < 8.5)
-]
-bow_thresh = elite_bowlers['bowling_elo'].quantile(0.90)
-elite_bowlers = elite_bowlers[elite_bowlers['bowling_elo'] >= bow_thresh]
-elite_bowlers.to_csv('elite_bowlers.csv')
+# --- Pipeline stages ---
+def batting_career(agg_bat):
+    career_bat = agg_bat.groupby('player').agg(
+        total_runs=('runs', 'sum'),
+        total_balls=('balls', 'sum'),
+        matches_played=('match_id', 'nunique')
+    )
+    career_bat['bat_avg'] = career_bat['total_runs'] / career_bat['matches_played']
+    career_bat['strike_rate'] = (career_bat['total_runs'] / career_bat['total_balls']) * 100
+    career_bat['milestone_1000_runs'] = career_bat['total_runs'] >= 1000
+    return career_bat
+
+
+def batting_elo(agg_bat):
+    elo_df = elo_history(agg_bat, batting_result(agg_bat['runs']), 'batter', 'batting_elo')
+    elo_df['date'] = pd.to_datetime(elo_df['date'], errors='coerce')
+    return elo_df
+
+
+def bowling_career(agg_bowl):
+    # agg_bowl already limited to spells of at least MIN_BOWLING_BALLS
+    career_bowl = agg_bowl.groupby('player').agg(
+        matches_2plus_overs=('match_id', 'nunique'),
+        total_wickets=('wickets', 'sum'),
+        total_balls=('balls', 'sum'),
+        total_runs=('runs_conceded', 'sum')
+    )
+    career_bowl['bowling_avg'] = career_bowl['total_runs'] / career_bowl['total_wickets'].replace(0, np.nan)
+    career_bowl['economy'] = career_bowl['total_runs'] / (career_bowl['total_balls'] / 6).replace(0, np.nan)
+    career_bowl['wickets_per_match'] = career_bowl['total_wickets'] / career_bowl['matches_2plus_overs']
+    career_bowl['milestone_100_wickets'] = career_bowl['total_wickets'] >= 100
+    return career_bowl
+
+
+def bowling_elo(agg_bowl):
+    bowl_results = bowling_result(agg_bowl['wickets'], agg_bowl['balls'], agg_bowl['runs_conceded'])
+    elo_bowl_df = elo_history(agg_bowl, bowl_results, 'bowler', 'bowling_elo')
+    elo_bowl_df['date'] = pd.to_datetime(elo_bowl_df['date'], errors='coerce')
+    return elo_bowl_df
+
+
+def allrounders(career_bat, career_bowl):
+    allrounder_df = career_bat[['batting_elo', 'total_runs', 'matches_played']].merge(
+        career_bowl[['bowling_elo', 'total_wickets', 'matches_2plus_overs']],
+        left_index=True, right_index=True, how='inner'
+    )
+    allrounder_df = allrounder_df[
+        (allrounder_df['total_runs'] >= 500) &
+        (allrounder_df['total_wickets'] >= 30) &
+        (allrounder_df['matches_played'] >= 20) &
+        (allrounder_df['matches_2plus_overs'] >= 20)
+    ]
+    allrounder_df['allrounder_elo'] = allrounder_elo(allrounder_df['batting_elo'], allrounder_df['bowling_elo'])
+    return allrounder_df
+
+
+def fielding_table(fielding_stats):
+    if not fielding_stats.empty:
+        fielding_stats['total_fielding'] = fielding_stats.sum(axis=1)
+    return fielding_stats
+
+
+def with_names(table, names):
+    # Player tables are keyed by player key (ingest.py); the display name goes in front
+    if not table.empty:
+        table.insert(0, 'name', names.reindex(table.index).to_numpy())
+    return table
+
+
+def write_csvs(outputs, out_dir):
+    for name, frame in outputs.items():
+        if name == 'fielding_stats' and frame.empty:
+            frame = pd.DataFrame()  # Empty if no data
+        frame.to_csv(os.path.join(out_dir, f"{name}.csv"), index=not name.startswith('elo_history'))
+
+
+def player_outputs(agg_bat, agg_bowl, fielding_stats, report=None):
+    """Per-player stages: careers, Elo histories and final ratings, all-rounders.
+
+    Every row depends on one player's matches only, which is what lets sharded runs call
+    this once per shard of players (shard_outputs) and concatenate the results.
+    """
+    report = report if report is not None else RunReport()
+    # --- Batting career stats and Elo ---
+    with report.stage('batting_career') as stage:
+        career_bat = batting_career(agg_bat)
+        stage.rows = len(agg_bat)
+    with report.stage('batting_elo') as stage:
+        elo_df = batting_elo(agg_bat)
+        career_bat['batting_elo'] = final_ratings(elo_df, 'batter', 'batting_elo')
+        stage.rows = len(elo_df)
+
+    # --- Bowling career stats and Elo ---
+    with report.stage('bowling_career') as stage:
+        agg_bowl = agg_bowl[agg_bowl['balls'] >= MIN_BOWLING_BALLS]
+        career_bowl = bowling_career(agg_bowl)
+        stage.rows = len(agg_bowl)
+    with report.stage('bowling_elo') as stage:
+        elo_bowl_df = bowling_elo(agg_bowl)
+        career_bowl['bowling_elo'] = final_ratings(elo_bowl_df, 'bowler', 'bowling_elo')
+        stage.rows = len(elo_bowl_df)
+
+    with report.stage('allrounders') as stage:
+        allrounder_df = allrounders(career_bat, career_bowl)
+        stage.rows = len(allrounder_df)
+    return {
+        'batting_stats': career_bat,
+        'bowling_stats': career_bowl,
+        'allrounder_stats': allrounder_df,
+        'fielding_stats': fielding_stats,
+        'elo_history_batting': elo_df,
+        'elo_history_bowling': elo_bowl_df
+    }
+
+
+def shard_outputs(bat, bowl, fielding, aggregated=False):
+    # One shard of players, in a worker process: aggregation of its delivery rows (unless
+    # --stream already aggregated them), then player_outputs
+    if not aggregated:
+        bat, bowl, fielding = aggregate_batting(bat), aggregate_bowling(bowl), fielding_counts(fielding)
+    return player_outputs(bat, bowl, fielding)
+
+
+def shard_deliveries(parts):
+    # One shard's compact delivery parts (sharding.parse_sharded), in a worker process: its
+    # matchup / cube / registry partials, then shard_outputs
+    bat_df, bowl_df, fielding_df, people_df = delivery_frames(parts)
+    del parts
+    partials = delivery_partials(bat_df, bowl_df, fielding_df, people_df)
+    partials['rows'] = len(bat_df) + len(bowl_df) + len(fielding_df)
+    return shard_outputs(bat_df, bowl_df, fielding_df), partials
+
+
+def merge_shards(results):
+    # Shard outputs back into the serial tables and row order
+    merged = {name: merge_frames([result[name] for result in results])
+              for name in ['batting_stats', 'bowling_stats', 'allrounder_stats']}
+    merged['fielding_stats'] = merge_counts([result['fielding_stats'] for result in results])
+    merged['elo_history_batting'] = merge_frames([result['elo_history_batting'] for result in results], 'batter')
+    merged['elo_history_bowling'] = merge_frames([result['elo_history_bowling'] for result in results], 'bowler')
+    return merged
+
+
+def run_pipeline(league_folders, report, out_dir='.', workers=1, store=None, stream=False, chunk_files=200,
+                 shards=1):
+    """Runs every pipeline stage, recording each in `report`, and writes the outputs to out_dir.
+
+    shards > 1 hash-partitions players over that many processes for aggregation, Elo and the
+    matchup / cube / registry partials (sharding.py); the outputs are identical to a serial
+    run. Returns the output tables by name.
+    """
+    paths = {'matchup_path': os.path.join(out_dir, MATCHUPS), 'cube_path': os.path.join(out_dir, CUBE),
+             'registry_path': os.path.join(out_dir, REGISTRY)}
+    tables = load_aggregates(league_folders, workers=workers, store=store, stream=stream, chunk_files=chunk_files,
+                             report=report, shards=shards, **paths)
+
+    if shards > 1 and stream:
+        with report.stage('sharded_players') as stage:
+            # Already aggregated while streaming: fielding counts are keyed by index
+            results, stage.record['shards'] = run_sharded(shard_outputs, tables, shards, keys=['player', 'player', None],
+                                                          aggregated=True)
+            players = merge_shards(results)
+            stage.rows = sum(len(table) for table in tables)
+    elif shards > 1:
+        with report.stage('sharded_players') as stage:
+            results, stage.record['shards'] = map_shards(shard_deliveries, [(parts,) for parts in tables])
+            del tables
+            players = merge_shards([outputs for outputs, _ in results])
+            stage.rows = sum(partials['rows'] for _, partials in results)
+        save_partials([partials for _, partials in results], report, **paths)
+    else:
+        players = player_outputs(*tables, report)
+    career_bat, career_bowl = players['batting_stats'], players['bowling_stats']
+    allrounder_df, elo_df, elo_bowl_df = players['allrounder_stats'], players['elo_history_batting'], players['elo_history_bowling']
+
+    # --- Fielding, display names and elite filtering (top 10% over all players) ---
+    with report.stage('fielding') as stage:
+        fielding_stats = fielding_table(players['fielding_stats'])
+        stage.rows = len(fielding_stats)
+    with report.stage('player_names') as stage:
+        names = display_names(pd.read_parquet(paths['registry_path']))
+        for table in (career_bat, career_bowl, allrounder_df, fielding_stats):
+            with_names(table, names)
+        stage.rows = len(names)
+    with report.stage('elite_filtering') as stage:
+        elite_batters, elite_bowlers, elite_allrounders = elite_tables(career_bat, career_bowl, allrounder_df)
+        stage.rows = len(elite_batters) + len(elite_bowlers) + len(elite_allrounders)
+
+    outputs = {
+        'batting_stats': career_bat,
+        'bowling_stats': career_bowl,
+        'allrounder_stats': allrounder_df,
+        'fielding_stats': fielding_stats,
+        'elite_batters': elite_batters,
+        'elite_bowlers': elite_bowlers,
+        'elite_allrounders': elite_allrounders,
+        'elo_history_batting': elo_df,
+        'elo_history_bowling': elo_bowl_df
+    }
+    with report.stage('write_csv') as stage:
+        write_csvs(outputs, out_dir)
+        stage.rows = sum(len(frame) for frame in outputs.values())
+        stage.files = len(outputs)
+
+    # --- Rating checkpoints for incremental updates (see elo_checkpoints.py) ---
+    with report.stage('write_checkpoints') as stage:
+        write_checkpoints(elo_df, 'batting', os.path.join(out_dir, CHECKPOINT_DIR))
+        write_checkpoints(elo_bowl_df, 'bowling', os.path.join(out_dir, CHECKPOINT_DIR))
+        stage.rows = len(elo_df) + len(elo_bowl_df)
+
+    # --- Binary snapshot for the dashboard ---
+    with report.stage('write_snapshot') as stage:
+        snapshot = {name: frame for name, frame in outputs.items() if name != 'fielding_stats' or not frame.empty}
+        write_snapshot(snapshot, os.path.join(out_dir, SNAPSHOT_DIR))
+        stage.rows = sum(len(frame) for frame in snapshot.values())
+        stage.files = len(snapshot)
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build Elo ratings and stats CSVs from Cricsheet JSON.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of processes used to parse match files (default: 1, serial)")
+    parser.add_argument('--store', metavar='DIR',
+                        help="Keep a Parquet delivery store in DIR and only parse new or changed match files")
+    parser.add_argument('--stream', action='store_true',
+                        help="Aggregate match files in chunks with integer-coded columns to bound peak memory")
+    parser.add_argument('--chunk-files', type=int, default=200,
+                        help="Match files per chunk in --stream mode (default: 200)")
+    parser.add_argument('--shards', type=int, default=1,
+                        help="Processes to hash-partition players over for aggregation and Elo "
+                             "(default: 1, serial; output is identical)")
+    parser.add_argument('--report', default=REPORT,
+                        help=f"JSON run report with per-stage timings (default: {REPORT})")
+    parser.add_argument('--profile', nargs='+', default=[], metavar='STAGE',
+                        help=f"cProfile these stages ('all' for every stage) into {PROFILE_DIR}/<stage>.prof")
+    parser.add_argument('--trace-memory', nargs='+', default=[], metavar='STAGE',
+                        help="Trace Python allocations with tracemalloc in these stages ('all' for every stage)")
+    args = parser.parse_args()
+
+    report = RunReport(profile=args.profile, trace_memory=args.trace_memory)
+    run_pipeline(league_folders, report, workers=args.workers, store=args.store, stream=args.stream,
+                 chunk_files=args.chunk_files, shards=args.shards)
+    report.write(args.report)
+
+    print("All CSVs saved.")
+    print(report.table())
+    print(f"Run report written to {args.report}")
 
-elo_thresh = allrounder_df['allrounder_elo'].quantile(0.90)
-elite_allrounders = allrounder_df[allrounder_df['allrounder_elo'] >= elo_thresh]
-elite_allrounders.to_csv('elite_allrounders.csv')
 
-print("All CSVs saved.")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import os
+import json
+import hashlib
+import pandas as pd
+import numpy as np
+from ingest import list_match_files, parse_files, BAT_COLUMNS, BOWL_COLUMNS, FIELDING_COLUMNS, PEOPLE_COLUMNS, PLAYER_KEY
+from match_io import MatchReader, file_stamp
+
+# Persisted delivery-level store: one Parquet file per (table, league, season) plus a
+# manifest of every ingested match file, so reruns only parse new or changed files.
+STORE_DIR = 'delivery_store'
+MANIFEST = 'manifest.json'
+TABLES = {
+    'bat': BAT_COLUMNS,
+    'bowl': BOWL_COLUMNS,
+    'fielding': FIELDING_COLUMNS,
+    'people': PEOPLE_COLUMNS
+}
+# Fingerprint of the table layout and player key; files ingested under another layout are parsed again
+SCHEMA = hashlib.sha1(json.dumps([TABLES, PLAYER_KEY], sort_keys=True).encode()).hexdigest()[:12]
+
+
+def file_sha1(path, reader):
+    # Match files are small, so they are hashed in one read (files and archive members alike)
+    return hashlib.sha1(reader.read(path)).hexdigest()
+
+
+def season_of(date):
+    # Season partition key from the match date string ('2023-04-01' -> '2023')
+    return date[:4] if isinstance(date, str) and len(date) >= 4 else 'unknown'
+
+
+def partition_path(store_dir, table, league, season):
+    return os.path.join(store_dir, table, f"league={league}", f"season={season}.parquet")
+
+
+def load_manifest(store_dir):
+    path = os.path.join(store_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(store_dir, manifest):
+    path = os.path.join(store_dir, MANIFEST)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def scan_files(files, manifest):
+    # Splits the current file listing into new/changed files and unchanged ones;
+    # size and mtime (CRC-32 for archive members) are checked first, the hash only when
+    # they differ.
+    to_parse, unchanged = [], []
+    with MatchReader() as reader:
+        for file_path, league in files:
+            size, stamp = file_stamp(file_path)
+            entry = manifest.get(file_path)
+            if entry is not None and entry['league'] == league and entry.get('schema') == SCHEMA:
+                if entry['size'] == size and entry['mtime_ns'] == stamp:
+                    unchanged.append(file_path)
+                    continue
+                sha1 = file_sha1(file_path, reader)
+                if entry['sha1'] == sha1:
+                    entry['mtime_ns'] = stamp
+                    unchanged.append(file_path)
+                    continue
+            to_parse.append((file_path, league))
+    return to_parse, unchanged
+
+
+def league_seasons(store_dir, table, league):
+    # Seasons with a partition file for the league
+    league_dir = os.path.dirname(partition_path(store_dir, table, league, 'unknown'))
+    if not os.path.exists(league_dir):
+        return []
+    return [fname[len('season='):-len('.parquet')] for fname in os.listdir(league_dir)
+            if fname.startswith('season=') and fname.endswith('.parquet')]
+
+
+def rewrite_partitions(store_dir, table, columns, new_rows, stale):
+    # Drops rows from stale source files and appends new rows, touching only affected partitions.
+    # `stale` maps each stale source path to its (league, season) partition.
+    touched = set()
+    for league, season in stale.values():
+        touched.add((league, season))
+        if season == 'unknown':
+            # Manifests once took the season from bat rows only, so a match without deliveries
+            # (abandoned, but with registry people) may have rows in any season of its league
+            touched |= {(league, other) for other in league_seasons(store_dir, table, league)}
+    if not new_rows.empty:
+        new_rows = new_rows.assign(season=new_rows['date'].map(season_of))
+        touched |= set(zip(new_rows['league'], new_rows['season']))
+    for league, season in sorted(touched):
+        path = partition_path(store_dir, table, league, season)
+        parts = []
+        if os.path.exists(path):
+            existing = pd.read_parquet(path)
+            parts.append(existing[~existing['source'].isin(stale.keys())])
+        if not new_rows.empty:
+            mask = (new_rows['league'] == league) & (new_rows['season'] == season)
+            parts.append(new_rows.loc[mask, columns + ['source']])
+        merged = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns + ['source'])
+        if merged.empty:
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        merged.to_parquet(path, index=False)
+
+
+def read_table(store_dir, table, columns, order):
+    # Reads every partition of a table and restores the serial file order given by `order`
+    root = os.path.join(store_dir, table)
+    paths = []
+    if os.path.exists(root):
+        for league_dir in sorted(os.listdir(root)):
+            for fname in sorted(os.listdir(os.path.join(root, league_dir))):
+                paths.append(os.path.join(root, league_dir, fname))
+    if not paths:
+        return pd.DataFrame()
+    df = pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+    if df.empty:
+        return pd.DataFrame()
+    rank = df['source'].map(order).to_numpy()
+    df = df.iloc[np.argsort(rank, kind='stable')].reset_index(drop=True)
+    return df[columns]
+
+
+def update_store(league_folders, store_dir=STORE_DIR, workers=1):
+    """Brings the store up to date with the league folders and returns (bat_df, bowl_df, fielding_df, people_df).
+
+    Only files that are new or whose contents changed since the last run are parsed; rows of
+    changed or deleted files are replaced. The returned frames match load_deliveries() row for row.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = load_manifest(store_dir)
+    files = list_match_files(league_folders)
+    to_parse, unchanged = scan_files(files, manifest)
+
+    current = {file_path for file_path, _ in files}
+    kept = set(unchanged)
+    stale = {path: (entry['league'], entry['season'])
+             for path, entry in manifest.items() if path not in kept}
+    removed = sum(1 for path in stale if path not in current)
+
+    tables = parse_files(to_parse, workers=workers, with_source=True)
+    for (table, columns), new_rows in zip(TABLES.items(), tables):
+        rewrite_partitions(store_dir, table, columns, new_rows, stale)
+
+    new_manifest = {path: manifest[path] for path in unchanged}
+    # Season per parsed file from whichever table has its rows (all rows of a match share its
+    # date): a match without deliveries still has registry people partitioned by season
+    seasons = {}
+    for new_rows in tables:
+        if not new_rows.empty:
+            firsts = new_rows.drop_duplicates('source')
+            for source, date in zip(firsts['source'], firsts['date']):
+                seasons.setdefault(source, season_of(date))
+    with MatchReader() as reader:
+        for file_path, league in to_parse:
+            size, stamp = file_stamp(file_path)
+            new_manifest[file_path] = {
+                'league': league,
+                'season': seasons.get(file_path, 'unknown'),
+                'size': size,
+                'mtime_ns': stamp,  # CRC-32 for archive members
+                'sha1': file_sha1(file_path, reader),
+                'schema': SCHEMA
+            }
+    save_manifest(store_dir, new_manifest)
+    print(f"Delivery store: {len(to_parse)} new/changed files parsed, "
+          f"{len(unchanged)} unchanged, {removed} removed.")
+
+    order = {file_path: rank for rank, (file_path, _) in enumerate(files)}
+    return tuple(read_table(store_dir, table, columns, order) for table, columns in TABLES.items())
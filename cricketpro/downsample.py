@@ -0,0 +1,44 @@
+import numpy as np
+
+# Largest-Triangle-Three-Buckets downsampling for Elo progression charts: keeps the first and
+# last points and, from each of the buckets in between, the point forming the largest
+# triangle with the previously kept point and the next bucket's average. Peaks and dips
+# survive, and a trace never exceeds its point budget however long the career gets.
+POINTS_PER_TRACE = 200
+
+
+def lttb_indices(x, y, max_points):
+    # Row positions to keep, in increasing order
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (max_points - 2)
+    edges = np.floor(np.arange(max_points - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+    keep = np.empty(max_points, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def downsample_history(hist, rating_col, max_points=POINTS_PER_TRACE):
+    # One player's history rows reduced to at most max_points, dates used as the x axis
+    if len(hist) <= max_points:
+        return hist
+    dates = hist['date']
+    if dates.isna().any():
+        x = np.arange(len(hist))
+    else:
+        x = dates.to_numpy().astype('datetime64[ns]').astype(np.int64)
+    return hist.iloc[lttb_indices(x, hist[rating_col].to_numpy(), max_points)]
@@ -0,0 +1,32 @@
+import numpy as np
+
+# Elite tables: the top 10% by Elo among players meeting each table's eligibility filters.
+# Built from the career tables by the full pipeline (cricketelo.py) and again when an
+# incremental Elo update rewrites their ratings (elo_checkpoints.py).
+
+
+def allrounder_elo(batting_elo, bowling_elo):
+    # Geometric mean of the two ratings
+    return np.sqrt(batting_elo * bowling_elo)
+
+
+def elite_tables(career_bat, career_bowl, allrounder_df):
+    # Top 10% by Elo among players meeting the eligibility filters
+    min_matches = 20
+    elite_batters = career_bat[career_bat['matches_played'] >= min_matches]
+    bat_thresh = elite_batters['batting_elo'].quantile(0.90)
+    elite_batters = elite_batters[elite_batters['batting_elo'] >= bat_thresh]
+
+    elite_bowlers = career_bowl[
+        (career_bowl['matches_2plus_overs'] >= 30) &
+        (career_bowl['total_wickets'] >= 100) &
+        (career_bowl['wickets_per_match'] >= 0.8) &
+        (career_bowl['bowling_avg'] < 35) &
+        (career_bowl['economy'] < 8.5)
+    ]
+    bow_thresh = elite_bowlers['bowling_elo'].quantile(0.90)
+    elite_bowlers = elite_bowlers[elite_bowlers['bowling_elo'] >= bow_thresh]
+
+    elo_thresh = allrounder_df['allrounder_elo'].quantile(0.90)
+    elite_allrounders = allrounder_df[allrounder_df['allrounder_elo'] >= elo_thresh]
+    return elite_batters, elite_bowlers, elite_allrounders
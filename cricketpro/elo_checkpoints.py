@@ -0,0 +1,314 @@
+import os
+import argparse
+import pandas as pd
+import numpy as np
+from ingest import parse_files
+from aggregate import aggregate_batting, aggregate_bowling, MIN_BOWLING_BALLS
+from elo_engine import batting_result, bowling_result, elo_history, INITIAL_ELO
+from elite import elite_tables, allrounder_elo
+from snapshot import write_snapshot, SNAPSHOT_DIR
+
+# Persisted Elo rating state: per player rating, matches rated and last match date. A full
+# pipeline run writes one checkpoint per season (state after that season's last match) plus
+# a head checkpoint; new matches are then rated on top of the head without replaying
+# history, and a correction to an earlier season rewinds to that season's checkpoint first.
+# Every (player, date, league) rated is logged next to the head so a match applied twice is
+# skipped rather than rated again.
+CHECKPOINT_DIR = 'elo_checkpoints'
+HEAD = 'head.parquet'
+APPLIED = 'applied.parquet'
+KINDS = {
+    'batting': ('batter', 'batting_elo', 'elo_history_batting.csv'),
+    'bowling': ('bowler', 'bowling_elo', 'elo_history_bowling.csv')
+}
+
+
+def empty_state():
+    state = pd.DataFrame({
+        'rating': pd.Series(dtype=np.float64),
+        'matches': pd.Series(dtype=np.int64),
+        'last_date': pd.Series(dtype='datetime64[ns]')
+    })
+    state.index.name = 'player'
+    return state
+
+
+def rating_state(history, name_col, rating_col):
+    # State after the given history rows, which must be chronological per player
+    grouped = history.groupby(name_col)
+    state = pd.DataFrame({
+        'rating': grouped[rating_col].last(),
+        'matches': grouped.size(),
+        'last_date': grouped['date'].max().astype('datetime64[ns]')
+    })
+    state.index.name = 'player'
+    return state
+
+
+def advance_state(state, history, name_col, rating_col):
+    # State updated with history rows dated after everything already in it
+    if history.empty:
+        return state
+    new = rating_state(history, name_col, rating_col)
+    merged = state.reindex(state.index.union(new.index))
+    merged.loc[new.index, 'rating'] = new['rating']
+    merged.loc[new.index, 'matches'] = merged.loc[new.index, 'matches'].fillna(0) + new['matches']
+    merged.loc[new.index, 'last_date'] = new['last_date']
+    merged['matches'] = merged['matches'].astype(np.int64)
+    merged.index.name = 'player'
+    return merged
+
+
+def season_path(ckpt_dir, kind, season):
+    return os.path.join(ckpt_dir, kind, f"season={season}.parquet")
+
+
+def checkpoint_seasons(ckpt_dir, kind):
+    kind_dir = os.path.join(ckpt_dir, kind)
+    if not os.path.exists(kind_dir):
+        return []
+    return sorted(int(fname[len('season='):-len('.parquet')])
+                  for fname in os.listdir(kind_dir) if fname.startswith('season='))
+
+
+def save_state(state, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    state.to_parquet(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_state(kind, ckpt_dir=CHECKPOINT_DIR, season=None):
+    # Head state, or the state at the end of `season`
+    path = os.path.join(ckpt_dir, kind, HEAD) if season is None else season_path(ckpt_dir, kind, season)
+    if not os.path.exists(path):
+        if season is None:
+            return empty_state()
+        raise FileNotFoundError(f"No {kind} checkpoint for season {season} in {ckpt_dir}")
+    return pd.read_parquet(path)
+
+
+def season_states(state, history, name_col, rating_col):
+    """(season, state at its end) for every season of `history`, starting from `state`.
+
+    Same states as advance_state() applied season by season, from one groupby over
+    (player, season): ratings and last dates are carried forward across seasons and match
+    counts summed cumulatively.
+    """
+    years = history['date'].dt.year
+    dated = history[years.notna()]
+    if dated.empty:
+        return []
+    grouped = dated.groupby([dated[name_col].rename('player'), years[years.notna()].astype(int).rename('season')])
+    ratings = grouped[rating_col].last().unstack()
+    players = ratings.index.union(state.index)
+    seasons = ratings.columns
+    # Column 0 is the starting state, then one column per season
+    start = state.reindex(players)
+    ratings = np.column_stack([start['rating'].to_numpy(), ratings.reindex(players).to_numpy()])
+    counts = grouped.size().unstack(fill_value=0).reindex(players, fill_value=0).to_numpy()
+    dates = grouped['date'].max().astype('datetime64[ns]').unstack().reindex(players)
+    dates = np.column_stack([start['last_date'].to_numpy(), dates.to_numpy()])
+    ratings = pd.DataFrame(ratings).ffill(axis=1).to_numpy()
+    dates = pd.DataFrame(dates).ffill(axis=1).to_numpy()
+    matches = start['matches'].fillna(0).to_numpy(dtype=np.int64)[:, None] + np.cumsum(counts, axis=1)
+    known = players.isin(state.index)[:, None] | (np.cumsum(counts, axis=1) > 0)
+    states = []
+    for i, season in enumerate(seasons):
+        rows = known[:, i]
+        season_state = pd.DataFrame({
+            'rating': ratings[rows, i + 1],
+            'matches': matches[rows, i],
+            'last_date': dates[rows, i + 1].astype('datetime64[ns]')
+        }, index=players[rows])
+        season_state.index.name = 'player'
+        states.append((int(season), season_state))
+    return states
+
+
+def save_season_checkpoints(state, history, kind, ckpt_dir):
+    # Saves the end state of every season in `history`, starting from `state`
+    name_col, rating_col, _ = KINDS[kind]
+    for season, season_state in season_states(state, history, name_col, rating_col):
+        save_state(season_state, season_path(ckpt_dir, kind, season))
+
+
+def applied_keys(frame, name_col):
+    # (player, date, league) of rated player matches
+    return pd.DataFrame({
+        'player': frame[name_col].astype(str).to_numpy(),
+        'date': pd.to_datetime(frame['date'], errors='coerce').astype('datetime64[ns]').to_numpy(),
+        'league': frame['league'].astype(str).to_numpy()
+    })
+
+
+def load_applied(kind, ckpt_dir=CHECKPOINT_DIR):
+    # None when the checkpoints predate the log
+    path = os.path.join(ckpt_dir, kind, APPLIED)
+    return pd.read_parquet(path) if os.path.exists(path) else None
+
+
+def write_checkpoints(history, kind, ckpt_dir=CHECKPOINT_DIR):
+    """Replaces the checkpoints of `kind` with ones built from a full Elo history."""
+    name_col, rating_col, _ = KINDS[kind]
+    for season in checkpoint_seasons(ckpt_dir, kind):
+        os.remove(season_path(ckpt_dir, kind, season))
+    save_season_checkpoints(empty_state(), history, kind, ckpt_dir)
+    save_state(rating_state(history, name_col, rating_col), os.path.join(ckpt_dir, kind, HEAD))
+    save_state(applied_keys(history, name_col), os.path.join(ckpt_dir, kind, APPLIED))
+
+
+def apply_matches(agg, results, kind, ckpt_dir=CHECKPOINT_DIR):
+    """Rates new per-match aggregates on top of the head checkpoint; returns their history rows
+    and the number of rows skipped because that player's match was already rated.
+
+    `agg` has the columns of the pipeline's agg_bat / agg_bowl and `results` the per-row match
+    results. New matches may not be older than the newest match already applied, nor on that
+    day unless not yet rated; rewind() to an earlier season first to correct past data. The
+    head, season checkpoints and applied-match log are updated.
+    """
+    name_col, rating_col, _ = KINDS[kind]
+    head = load_state(kind, ckpt_dir)
+    empty = pd.DataFrame(columns=['date', name_col, rating_col, 'league'])
+    if agg.empty:
+        return empty, 0
+    dates = pd.to_datetime(agg['date'], errors='coerce').astype('datetime64[ns]')
+    if dates.isna().any():
+        raise ValueError("New matches must have a date")
+    applied = load_applied(kind, ckpt_dir)
+    if applied is None and not head.empty:
+        raise ValueError(f"{ckpt_dir} has no log of applied {kind} matches; rerun cricketelo.py to rebuild it")
+    keys = applied_keys(agg.assign(date=dates), 'player')
+    done = (pd.MultiIndex.from_frame(keys).isin(pd.MultiIndex.from_frame(applied))
+            if applied is not None else np.zeros(len(agg), dtype=bool))
+    agg, dates, results = agg[~done], dates[~done], np.asarray(results)[~done]
+    if agg.empty:
+        return empty, int(done.sum())
+    newest = head['last_date'].max()
+    if not head.empty and (dates < newest).any():
+        raise ValueError(f"{int((dates < newest).sum())} new matches are older than the latest "
+                         f"applied match ({newest.date()}); rewind to an earlier season first")
+    agg = agg.assign(date=dates)
+    initial = head['rating'].reindex(agg['player'].to_numpy()).fillna(INITIAL_ELO).to_numpy()
+    history = elo_history(agg, results, name_col, rating_col, initial=initial)
+    save_season_checkpoints(head, history, kind, ckpt_dir)
+    save_state(advance_state(head, history, name_col, rating_col), os.path.join(ckpt_dir, kind, HEAD))
+    save_state(pd.concat([applied, applied_keys(history, name_col)], ignore_index=True),
+               os.path.join(ckpt_dir, kind, APPLIED))
+    return history, int(done.sum())
+
+
+def append_history(history, history_path):
+    history.to_csv(history_path, mode='a', index=False, header=not os.path.exists(history_path))
+
+
+def rewind(kind, season, ckpt_dir=CHECKPOINT_DIR, history_path=None):
+    """Resets the head to the end of `season`, dropping later checkpoints and history rows."""
+    state = load_state(kind, ckpt_dir, season)
+    for later in checkpoint_seasons(ckpt_dir, kind):
+        if later > season:
+            os.remove(season_path(ckpt_dir, kind, later))
+    save_state(state, os.path.join(ckpt_dir, kind, HEAD))
+    applied = load_applied(kind, ckpt_dir)
+    if applied is not None:
+        save_state(applied[~(applied['date'].dt.year > season)], os.path.join(ckpt_dir, kind, APPLIED))
+    if history_path is not None and os.path.exists(history_path):
+        history = pd.read_csv(history_path)
+        years = pd.to_datetime(history['date'], errors='coerce').dt.year
+        history[years <= season].to_csv(history_path, index=False)
+    return state
+
+
+def refresh_career_elo(data_dir='.', ckpt_dir=CHECKPOINT_DIR):
+    """Rewrites the Elo columns of the career tables from the head checkpoints, rebuilds the
+    elite tables from them and refreshes their snapshot, so leaderboards agree with the
+    updated histories.
+
+    Career totals are left as they are; they, and players who debuted since the last full
+    run, only change with a full pipeline run. Returns the number of players whose rating
+    has no career row or whose career row has no head rating (debuts and rewound players).
+    """
+    def read(name):
+        return pd.read_csv(os.path.join(data_dir, f"{name}.csv"), index_col=0, float_precision='round_trip')
+    career_bat, career_bowl, allrounder_df = read('batting_stats'), read('bowling_stats'), read('allrounder_stats')
+    heads = {kind: load_state(kind, ckpt_dir)['rating'] for kind in KINDS}
+    unmatched = 0
+    for kind, career in [('batting', career_bat), ('bowling', career_bowl)]:
+        unmatched += len(heads[kind].index.symmetric_difference(career.index))
+    for table in (career_bat, allrounder_df):
+        table['batting_elo'] = heads['batting'].reindex(table.index).fillna(table['batting_elo'])
+    for table in (career_bowl, allrounder_df):
+        table['bowling_elo'] = heads['bowling'].reindex(table.index).fillna(table['bowling_elo'])
+    allrounder_df['allrounder_elo'] = allrounder_elo(allrounder_df['batting_elo'], allrounder_df['bowling_elo'])
+    elite_batters, elite_bowlers, elite_allrounders = elite_tables(career_bat, career_bowl, allrounder_df)
+    outputs = {
+        'batting_stats': career_bat,
+        'bowling_stats': career_bowl,
+        'allrounder_stats': allrounder_df,
+        'elite_batters': elite_batters,
+        'elite_bowlers': elite_bowlers,
+        'elite_allrounders': elite_allrounders
+    }
+    for name, frame in outputs.items():
+        frame.to_csv(os.path.join(data_dir, f"{name}.csv"))
+    snapshot_dir = os.path.join(data_dir, SNAPSHOT_DIR)
+    if os.path.exists(snapshot_dir):
+        write_snapshot(outputs, snapshot_dir)
+    return unmatched
+
+
+def report_refresh(unmatched):
+    print("Career and elite tables: Elo columns refreshed from the new ratings.")
+    if unmatched:
+        print(f"  {unmatched} players debuted or were rewound out since the last full run; their career rows "
+              "(and all career totals) update with a full run of cricketelo.py.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental Elo updates on top of rating checkpoints.")
+    parser.add_argument('--checkpoints', default=CHECKPOINT_DIR, help="Checkpoint directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+    update = commands.add_parser('update', help="Rate new match files and append them to the Elo histories")
+    update.add_argument('--matches', nargs='+', action='append', required=True, metavar=('LEAGUE', 'FILE'),
+                        help="League label followed by its new Cricsheet JSON files; repeat per league")
+    back = commands.add_parser('rewind', help="Reset ratings and histories to the end of a season")
+    back.add_argument('season', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'rewind':
+        for kind, (_, _, history_path) in KINDS.items():
+            state = rewind(kind, args.season, args.checkpoints, history_path)
+            print(f"{kind}: rewound to end of {args.season} ({len(state)} players)")
+        report_refresh(refresh_career_elo(ckpt_dir=args.checkpoints))
+        return
+
+    # A file listed twice would have its deliveries summed into one doubled match
+    files = list({os.path.abspath(path): league for league, *paths in args.matches for path in paths}.items())
+    bat_df, bowl_df = parse_files(files)[:2]
+    updates = {}
+    if not bat_df.empty:
+        agg_bat = aggregate_batting(bat_df)
+        updates['batting'] = (agg_bat, batting_result(agg_bat['runs']))
+    if not bowl_df.empty:
+        agg_bowl = aggregate_bowling(bowl_df)
+        agg_bowl = agg_bowl[agg_bowl['balls'] >= MIN_BOWLING_BALLS]
+        updates['bowling'] = (agg_bowl, bowling_result(agg_bowl['wickets'], agg_bowl['balls'],
+                                                       agg_bowl['runs_conceded']))
+    rated = 0
+    for kind in KINDS:
+        if kind not in updates:
+            print(f"{kind}: no deliveries in the new match files")
+            continue
+        history, skipped = apply_matches(*updates[kind], kind, args.checkpoints)
+        if skipped:
+            print(f"{kind}: {skipped} player matches already applied, skipped")
+        if not history.empty:
+            append_history(history, KINDS[kind][2])
+        rated += len(history)
+        print(f"{kind}: {len(history)} rating updates appended to {KINDS[kind][2]}")
+    if rated:
+        report_refresh(refresh_career_elo(ckpt_dir=args.checkpoints))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import pandas as pd
+import numpy as np
+
+# Vectorized Elo engine. Ratings only move by K * (result - expected) per match, so a
+# player's trajectory is a running sum over their matches in date order. The sums are
+# advanced one career step at a time for all players at once, so the loop runs once
+# per match of the longest career instead of once per row.
+K_BASE = 10
+INITIAL_ELO = 1500
+EXPECTED = 0.5
+
+
+# Default constants of the result formulas; elo_sweep.py varies them
+BATTING_PARAMS = {'norm_runs': 30, 'bonus_50': 0.05, 'bonus_150': 0.15}
+BOWLING_PARAMS = {'wickets_per_point': 2, 'economy_pivot': 7.5, 'economy_weight': 0.25}
+
+
+def batting_result(runs, norm_runs=30, bonus_50=0.05, bonus_150=0.15):
+    # log1p(runs) scaled so norm_runs scores 1.0, with bonuses for 50s and 150s, capped at 1.0.
+    # Parameters may be arrays of configurations; pass runs[:, None] to get one column each.
+    runs = np.asarray(runs)
+    result = np.log1p(runs) / np.log1p(norm_runs)
+    result = result + np.where(runs >= 150, bonus_150, np.where(runs >= 50, bonus_50, 0.0))
+    return np.minimum(result, 1.0)
+
+
+def bowling_result(wickets, balls, runs_conceded, wickets_per_point=2, economy_pivot=7.5, economy_weight=0.25):
+    # A point per wickets_per_point wickets, adjusted by economy relative to economy_pivot,
+    # clipped to [0, 1]. Broadcasts over parameter arrays like batting_result.
+    wickets = np.asarray(wickets)
+    balls = np.asarray(balls)
+    runs_conceded = np.asarray(runs_conceded)
+    overs = np.where(balls > 0, balls / 6, 1)
+    economy = np.where(balls > 0, runs_conceded / overs, 8)
+    result = (wickets / wickets_per_point) - ((economy - economy_pivot) / economy_pivot) * economy_weight
+    return np.clip(result, 0, 1)
+
+
+def run_elo(players, dates, results, k=K_BASE, initial=INITIAL_ELO, expected=EXPECTED):
+    """Runs the Elo update over per-match results.
+
+    Rows are sorted once by (player, date); ties keep their input order. Returns
+    (order, ratings) where `order` is that sort as indices into the inputs and
+    ratings[i] is the player's rating after the match at inputs[order[i]].
+
+    `results` may also be 2-D (rows x configurations) with `k` one value per
+    configuration; every configuration is then rated in the same pass.
+    """
+    player_codes, _ = pd.factorize(np.asarray(players, dtype=object), sort=True)
+    date_keys = np.asarray(dates, dtype='datetime64[ns]')
+    order = np.lexsort((date_keys, player_codes))
+    codes = player_codes[order]
+    ratings = k * (np.asarray(results, dtype=np.float64)[order] - expected)
+    if len(codes) == 0:
+        return order, ratings
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    lengths = np.diff(np.r_[starts, len(codes)])
+    # initial may be one rating for everyone or one per input row (only each player's
+    # first row counts), e.g. ratings carried over from a checkpoint
+    first_initial = np.broadcast_to(np.asarray(initial, dtype=np.float64), len(codes))[order][starts]
+    ratings[starts] += first_initial if ratings.ndim == 1 else first_initial[:, None]
+    # Players sorted by career length, longest first, so the players still active at
+    # step j are a prefix. Additions happen in the same order as a row-by-row update,
+    # which keeps the ratings bit-identical to it.
+    by_length = np.argsort(-lengths, kind='stable')
+    starts, lengths = starts[by_length], lengths[by_length]
+    for step in range(1, lengths[0]):
+        active = np.searchsorted(-lengths, -step, side='left')
+        idx = starts[:active] + step
+        ratings[idx] += ratings[idx - 1]
+    return order, ratings
+
+
+def elo_history(agg, results, name_col, rating_col, k=K_BASE, initial=INITIAL_ELO, expected=EXPECTED):
+    # History frame (date, <name_col>, <rating_col>, league) in (player, date) order
+    order, ratings = run_elo(agg['player'].to_numpy(), agg['date'].to_numpy(), results, k, initial, expected)
+    return pd.DataFrame({
+        'date': agg['date'].to_numpy()[order],
+        name_col: agg['player'].to_numpy()[order],
+        rating_col: ratings,
+        'league': agg['league'].to_numpy()[order]
+    })
+
+
+def final_ratings(history, name_col, rating_col):
+    return history.groupby(name_col)[rating_col].last()
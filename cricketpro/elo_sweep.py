@@ -0,0 +1,164 @@
+import argparse
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+from aggregate import load_aggregates, MIN_BOWLING_BALLS
+from cricketelo import league_folders
+from elo_engine import (run_elo, batting_result, bowling_result, BATTING_PARAMS, BOWLING_PARAMS,
+                        K_BASE, EXPECTED)
+
+# Elo parameter sweep: many configurations of K and the result-formula constants are rated in
+# one pass. Results become a (matches x configurations) matrix and run_elo advances every
+# configuration together; blocks of configurations can be spread over a process pool.
+# Per configuration it reports final ratings plus
+#   predictive   - correlation of the pre-match rating with the match performance
+#                  (runs scored / wickets taken), players' first matches excluded
+#   stability    - Spearman correlation between players' ratings at the median match
+#                  date and their final ratings (players active on both sides)
+#   spread       - standard deviation of the final ratings
+SWEEPS = {
+    'batting': (batting_result, BATTING_PARAMS, ['runs'], 'runs'),
+    'bowling': (bowling_result, BOWLING_PARAMS, ['wickets', 'balls', 'runs_conceded'], 'wickets')
+}
+
+_shared = {}
+
+
+def config_grid(kind, values):
+    # Cartesian product of the given parameter values; unspecified parameters keep their defaults
+    defaults = {'k': K_BASE, **SWEEPS[kind][1]}
+    lists = [values.get(name) or [default] for name, default in defaults.items()]
+    return pd.DataFrame(list(itertools.product(*lists)), columns=list(defaults))
+
+
+def prepare(agg, kind):
+    # Arrays shared by every configuration block
+    _, _, input_cols, perf_col = SWEEPS[kind]
+    players = agg['player'].to_numpy()
+    dates = agg['date'].to_numpy().astype('datetime64[ns]')
+    codes, names = pd.factorize(np.asarray(players, dtype=object), sort=True)
+    return {
+        'kind': kind,
+        'players': players,
+        'dates': dates,
+        'codes': codes,
+        'names': np.asarray(names, dtype=object),
+        'inputs': [agg[col].to_numpy() for col in input_cols],
+        'performance': agg[perf_col].to_numpy().astype(np.float64)
+    }
+
+
+def column_corr(a, b):
+    a = a - a.mean(axis=0)
+    b = b - b.mean(axis=0)
+    denom = np.sqrt((a * a).sum(axis=0) * (b * b).sum(axis=0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (a * b).sum(axis=0) / denom
+
+
+def column_ranks(a):
+    return np.argsort(np.argsort(a, axis=0), axis=0).astype(np.float64)
+
+
+def evaluate_block(configs, data=None):
+    """Rates one block of configurations; returns (final ratings [players x configs], metrics frame)."""
+    data = data if data is not None else _shared
+    result_fn, param_defaults, _, _ = SWEEPS[data['kind']]
+    params = {name: configs[name].to_numpy() for name in param_defaults}
+    k = configs['k'].to_numpy().astype(np.float64)
+    results = result_fn(*(col[:, None] for col in data['inputs']), **params)
+    order, ratings = run_elo(data['players'], data['dates'], results, k=k)
+
+    codes = data['codes'][order]
+    dates = data['dates'][order]
+    n = len(codes)
+    ends = np.flatnonzero(np.r_[codes[1:] != codes[:-1], True])
+    first = np.r_[True, codes[1:] != codes[:-1]]
+    final = ratings[ends]
+
+    # Pre-match rating = rating after the match minus that match's update
+    pre = ratings - k * (results[order] - EXPECTED)
+    predictive = column_corr(pre[~first], data['performance'][order][~first][:, None])
+
+    # Rating as of the median match date: each player's last row on or before it
+    split = np.sort(dates)[n // 2]
+    before = dates <= split
+    last_before = np.full(len(ends), -1)
+    rows_before = np.flatnonzero(before)
+    np.maximum.at(last_before, codes[rows_before], rows_before)
+    after = np.zeros(len(ends), dtype=bool)
+    after[codes[~before]] = True
+    both = (last_before >= 0) & after
+    mid = ratings[last_before[both]]
+    stability = column_corr(column_ranks(mid), column_ranks(final[both]))
+
+    metrics = pd.DataFrame({
+        'predictive': predictive,
+        'stability': stability,
+        'spread': final.std(axis=0)
+    }, index=configs.index)
+    return final, metrics
+
+
+def init_worker(data):
+    _shared.update(data)
+
+
+def sweep(agg, kind, configs, workers=1, block=32):
+    """Rates every configuration in `configs` (one row each, see config_grid).
+
+    Returns (ratings, summary): final ratings as a players x configurations frame and the
+    configurations joined with their metrics.
+    """
+    data = prepare(agg, kind)
+    blocks = [configs.iloc[i:i + block] for i in range(0, len(configs), block)]
+    if workers > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(data,)) as pool:
+            outputs = list(pool.map(evaluate_block, blocks))
+    else:
+        outputs = [evaluate_block(configs_block, data) for configs_block in blocks]
+    ratings = pd.DataFrame(np.hstack([final for final, _ in outputs]),
+                           index=pd.Index(data['names'], name='player'),
+                           columns=[f"config_{i}" for i in configs.index])
+    summary = configs.join(pd.concat([metrics for _, metrics in outputs]))
+    summary.index.name = 'config'
+    return ratings, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep Elo parameters over many configurations in one pass.")
+    parser.add_argument('kind', choices=list(SWEEPS))
+    parser.add_argument('--k', type=float, nargs='+', help=f"K factor values (default: {K_BASE})")
+    for kind_name, (_, params, _, _) in SWEEPS.items():
+        for name, default in params.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=float, nargs='+',
+                                help=f"{kind_name} {name} values (default: {default})")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Processes for parsing match files and rating configuration blocks")
+    parser.add_argument('--block', type=int, default=32, help="Configurations rated together per block")
+    parser.add_argument('--store', metavar='DIR', help="Read deliveries through the Parquet store in DIR")
+    parser.add_argument('--stream', action='store_true', help="Aggregate in bounded memory")
+    args = parser.parse_args()
+    ignored = [f"--{name.replace('_', '-')}" for kind_name, (_, params, _, _) in SWEEPS.items()
+               if kind_name != args.kind for name in params if getattr(args, name) is not None]
+    if ignored:
+        parser.error(f"not used by a {args.kind} sweep: {', '.join(ignored)}")
+
+    values = {name: getattr(args, name) for name in ['k', *SWEEPS[args.kind][1]]}
+    configs = config_grid(args.kind, values)
+    agg_bat, agg_bowl, _ = load_aggregates(league_folders, workers=args.workers, store=args.store, stream=args.stream)
+    agg = agg_bat if args.kind == 'batting' else agg_bowl[agg_bowl['balls'] >= MIN_BOWLING_BALLS]
+
+    start = time.perf_counter()
+    ratings, summary = sweep(agg, args.kind, configs, workers=args.workers, block=args.block)
+    elapsed = time.perf_counter() - start
+    ratings.to_parquet(f"sweep_{args.kind}_ratings.parquet")
+    summary.to_csv(f"sweep_{args.kind}_summary.csv")
+    print(summary.sort_values('predictive', ascending=False).head(10).to_string())
+    print(f"{len(configs)} configurations rated in {elapsed:.1f}s over {len(agg)} player-matches.")
+
+
+if __name__ == '__main__':
+    main()
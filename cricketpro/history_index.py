@@ -0,0 +1,31 @@
+import numpy as np
+
+# Per-player index over an Elo history table: the table is sorted by player once and each
+# player maps to a contiguous row range, so one player's trajectory is a slice instead of a
+# boolean scan over the whole table.
+
+
+class PlayerIndex:
+    def __init__(self, hist, name_col):
+        self.name_col = name_col
+        if name_col not in hist.columns:
+            self.rows = hist.iloc[0:0]
+            self.ranges = {}
+            return
+        # Stable sort keeps each player's rows in their original (date) order
+        self.rows = hist.sort_values(name_col, kind='stable').reset_index(drop=True)
+        names = self.rows[name_col].to_numpy()
+        if len(names) == 0:
+            self.ranges = {}
+            return
+        starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]])
+        ends = np.r_[starts[1:], len(names)]
+        self.ranges = {names[start]: (start, end) for start, end in zip(starts, ends)}
+
+    def __contains__(self, player):
+        return player in self.ranges
+
+    def get(self, player):
+        # Rows for one player (empty frame if unknown), in O(that player's rows)
+        start, end = self.ranges.get(player, (0, 0))
+        return self.rows.iloc[start:end]
@@ -0,0 +1,206 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import pandas as pd
+import numpy as np
+from match_io import list_source, decode_match, MatchReader
+
+# Column layout of the three delivery tables built by the pipeline
+BAT_COLUMNS = ['player', 'team', 'league', 'date', 'runs', 'balls', 'match_type', 'dismissal', 'over']
+BOWL_COLUMNS = ['player', 'team', 'league', 'date', 'runs_conceded', 'balls', 'wickets', 'match_type', 'over']
+FIELDING_COLUMNS = ['player', 'event', 'date', 'league', 'over']
+PEOPLE_COLUMNS = ['player', 'player_id', 'league', 'date']
+INT_COLUMNS = {'runs', 'balls', 'runs_conceded', 'wickets', 'dismissal', 'over'}
+# The bat and bowl tables hold one row per delivery in the same order, so row i of each
+# is the same ball; 'dismissal' marks the striker getting out to the bowler on it.
+# 'over' is Cricsheet's 0-based over number within the innings.
+# The people table has one row per name in a match's info.registry.people (name -> Cricsheet
+# person id), the source of the player registry (player_registry.py).
+# The 'player' column of the bat, bowl and fielding tables holds the player key: the Cricsheet
+# person id the match's registry gives the name, or the name itself when the match lists no id,
+# so careers follow people rather than display names (player_registry.display_names() maps
+# keys back to names). Part of the delivery store's layout fingerprint.
+PLAYER_KEY = 'cricsheet_id'
+
+FIELDING_EVENTS = {
+    'caught': 'catch',
+    'run out': 'run_out',
+    'stumped': 'stumping'
+}
+
+# Dismissal kinds credited to the bowler
+BOWLER_DISMISSALS = {'bowled', 'caught', 'caught and bowled', 'lbw', 'stumped', 'hit wicket'}
+
+
+def extract_fielder_names(fielders):
+    # Handles list of dicts (with "name") or list of strings
+    names = []
+    if isinstance(fielders, list):
+        for f in fielders:
+            if isinstance(f, dict) and "name" in f:
+                names.append(f["name"])
+            elif isinstance(f, str):
+                names.append(f)
+    elif isinstance(fielders, dict) and "name" in fielders:
+        names.append(fielders["name"])
+    return names
+
+
+def bowler_dismissal(wickets, batter):
+    # True if the striker was out to the bowler on this delivery
+    return any(w.get('kind') in BOWLER_DISMISSALS and w.get('player_out') == batter for w in wickets)
+
+
+def match_dates(dates):
+    # Date part of match ids from parsed dates; undated matches are 'NaT' (pandas 3 turns NaT
+    # into a missing string, which would make groupby drop their rows)
+    return dates.astype(str).fillna('NaT')
+
+
+def list_match_files(league_folders):
+    # (file_path, league) for every match file, in the order the serial loop visits them.
+    # A league source may be a folder or a Cricsheet .zip archive (see match_io.py).
+    files = []
+    for folder, league in league_folders:
+        if os.path.exists(folder):
+            files.extend((file_path, league) for file_path in list_source(folder))
+    return files
+
+
+def parse_match(match, league, bat, bowl, fielding, people):
+    # Appends one match's deliveries to the bat/bowl/fielding column lists and its registry to people
+    info = match.get('info', {})
+    date = info.get('dates', [''])[0] if isinstance(info.get('dates', []), list) else info.get('dates', '')
+    match_type = info.get('match_type', 'T20')
+    ids = info.get('registry', {}).get('people', {})
+    for name, person_id in ids.items():
+        people['player'].append(name)
+        people['player_id'].append(person_id)
+        people['league'].append(league)
+        people['date'].append(date)
+    innings = match.get('innings', [])
+    for inning in innings:
+        team = inning.get('team', '')
+        overs = inning.get('overs', [])
+        for over in overs:
+            over_number = over.get('over', 0)
+            for delivery in over.get('deliveries', []):
+                runs = delivery.get('runs', {})
+                # Batting
+                batter, bowler = delivery.get('batter', ''), delivery.get('bowler', '')
+                bat['player'].append(ids.get(batter, batter))
+                bat['team'].append(team)
+                bat['league'].append(league)
+                bat['date'].append(date)
+                bat['runs'].append(runs.get('batter', 0))
+                bat['balls'].append(1)
+                bat['match_type'].append(match_type)
+                bat['dismissal'].append(
+                    1 if 'wickets' in delivery and bowler_dismissal(delivery['wickets'], batter) else 0)
+                bat['over'].append(over_number)
+                # Bowling
+                bowl['player'].append(ids.get(bowler, bowler))
+                bowl['team'].append(team)
+                bowl['league'].append(league)
+                bowl['date'].append(date)
+                bowl['runs_conceded'].append(runs.get('total', 0))
+                bowl['balls'].append(1)
+                bowl['wickets'].append(1 if 'wickets' in delivery else 0)
+                bowl['match_type'].append(match_type)
+                bowl['over'].append(over_number)
+                # Fielding
+                if 'wickets' in delivery:
+                    for wicket_info in delivery['wickets']:
+                        event = FIELDING_EVENTS.get(wicket_info.get('kind', ''))
+                        if event is None:
+                            continue
+                        for fielder_name in extract_fielder_names(wicket_info.get('fielders', [])):
+                            if fielder_name:
+                                fielding['player'].append(ids.get(fielder_name, fielder_name))
+                                fielding['event'].append(event)
+                                fielding['date'].append(date)
+                                fielding['league'].append(league)
+                                fielding['over'].append(over_number)
+
+
+def compact_columns(columns):
+    # Integer columns become int64 arrays, string columns become (codes, vocabulary) pairs
+    packed = {}
+    for name, values in columns.items():
+        if name in INT_COLUMNS:
+            packed[name] = np.asarray(values, dtype=np.int64)
+        else:
+            codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+            packed[name] = (codes.astype(np.int32), np.asarray(uniques, dtype=object))
+    return packed
+
+
+def parse_batch(batch, with_source=False):
+    # Worker entry point: parses a list of (file_path, league) into compact columnar arrays.
+    # With with_source, every table gets a 'source' column holding the originating file path.
+    bat = {col: [] for col in BAT_COLUMNS}
+    bowl = {col: [] for col in BOWL_COLUMNS}
+    fielding = {col: [] for col in FIELDING_COLUMNS}
+    people = {col: [] for col in PEOPLE_COLUMNS}
+    counts = []
+    with MatchReader() as reader:
+        for file_path, league in batch:
+            parse_match(decode_match(reader.read(file_path)), league, bat, bowl, fielding, people)
+            counts.append((len(bat['player']), len(bowl['player']), len(fielding['player']), len(people['player'])))
+    tables = [compact_columns(bat), compact_columns(bowl), compact_columns(fielding), compact_columns(people)]
+    if with_source:
+        paths = np.asarray([file_path for file_path, _ in batch], dtype=object)
+        ends = np.asarray(counts, dtype=np.int64).reshape(-1, 4)
+        for i, table in enumerate(tables):
+            per_file = np.diff(ends[:, i], prepend=0)
+            table['source'] = (np.repeat(np.arange(len(batch), dtype=np.int32), per_file), paths)
+    return tuple(tables)
+
+
+def column_length(column):
+    return len(column[0]) if isinstance(column, tuple) else len(column)
+
+
+def concat_columns(parts, columns):
+    # Decodes and concatenates the compact per-batch arrays into one DataFrame
+    if sum(column_length(part[columns[0]]) for part in parts) == 0:
+        return pd.DataFrame()
+    data = {}
+    for name in columns:
+        if name in INT_COLUMNS:
+            data[name] = np.concatenate([part[name] for part in parts])
+        else:
+            data[name] = np.concatenate([uniques[codes] for codes, uniques in (part[name] for part in parts)])
+    return pd.DataFrame(data)
+
+
+def make_batches(files, batch_size):
+    return [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+
+
+def parse_batches(files, workers=1, batch_size=64, with_source=False):
+    # Compact per-batch arrays (see parse_batch); workers > 1 parses batches in a process pool
+    batches = make_batches(files, batch_size)
+    if workers > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(partial(parse_batch, with_source=with_source), batches))
+    return [parse_batch(batch, with_source) for batch in batches]
+
+
+def build_frames(results, with_source=False):
+    # Decodes parse_batches output into (bat_df, bowl_df, fielding_df, people_df)
+    extra = ['source'] if with_source else []
+    bat_df = concat_columns([r[0] for r in results], BAT_COLUMNS + extra)
+    bowl_df = concat_columns([r[1] for r in results], BOWL_COLUMNS + extra)
+    fielding_df = concat_columns([r[2] for r in results], FIELDING_COLUMNS + extra)
+    people_df = concat_columns([r[3] for r in results], PEOPLE_COLUMNS + extra)
+    return bat_df, bowl_df, fielding_df, people_df
+
+
+def parse_files(files, workers=1, batch_size=64, with_source=False):
+    # Returns (bat_df, bowl_df, fielding_df, people_df)
+    return build_frames(parse_batches(files, workers, batch_size, with_source), with_source)
+
+
+def load_deliveries(league_folders, workers=1, batch_size=64):
+    return parse_files(list_match_files(league_folders), workers, batch_size)
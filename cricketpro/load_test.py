@@ -0,0 +1,177 @@
+import json
+import time
+import random
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from query_api import QueryService, CACHE_SIZE
+from query_server import QueryClient, make_server
+from player_registry import player_keys
+
+# Concurrent load on the query service: `clients` threads each send a random mix of the
+# dashboard's queries (leaderboard pages, as-of and sliced leaderboards, type-ahead search,
+# profiles, Elo trajectories, comparisons) for `duration` seconds, back to back. Targets are
+# a running query_server (--url), a server started here on --data-dir (the default), or the
+# service called directly (--in-process, no HTTP). Reports latency percentiles per query and
+# overall, throughput and the service's cache hit rate.
+DURATION = 10
+WARMUP = 2
+CLIENTS = 8
+PERCENTILES = [50, 95, 99]
+AS_OF_DATES = 24  # distinct as-of dates drawn from, spread over the rating history
+
+
+def workload(api):
+    """Query parameters drawn from the outputs themselves: the most-played players, the
+    slice filter values and a grid of as-of dates."""
+    players = api.search('', 200)
+    options = api.slice_options()
+    date_range = api.rating_range('batting')
+    dates = []
+    if date_range is not None:
+        dates = [str(date.date()) for date in pd.date_range(*date_range, periods=AS_OF_DATES)]
+    return {'players': list(zip(players['player'], player_keys(players))), 'options': options, 'dates': dates}
+
+
+def query_mix(params):
+    # (name, weight, rng -> (method, args, kwargs)); weights follow what a dashboard session
+    # sends most: pages and searches on every interaction, trajectories per chart
+    players, options, dates = params['players'], params['options'], params['dates']
+    kinds = ['batting', 'bowling', 'allrounder']
+
+    def player(rng):
+        return rng.choice(players)
+
+    def page(rng):
+        return 'leaderboard', (rng.choice(kinds),), {'elite': rng.random() < 0.5, 'page': rng.randint(1, 3)}
+
+    def as_of(rng):
+        return 'leaderboard', (rng.choice(kinds),), {'as_of': rng.choice(dates)}
+
+    def sliced(rng):
+        return 'leaderboard', (rng.choice(kinds),), {'leagues': [rng.choice(options['leagues'])],
+                                                     'phases': [rng.choice(options['phases'])]}
+
+    def search(rng):
+        name = player(rng)[0]
+        return 'search', (name[:rng.randint(1, min(len(name), 6))],), {}
+
+    def profile(rng):
+        return 'player', (player(rng)[1],), {}
+
+    def trajectory(rng):
+        return 'trajectory', (rng.choice(kinds[:2]), player(rng)[1]), {}
+
+    def compare(rng):
+        return 'compare', (player(rng)[1], player(rng)[1]), {}
+
+    mix = [('leaderboard', 30, page), ('search', 20, search), ('trajectory', 15, trajectory),
+           ('player', 10, profile), ('compare', 5, compare)]
+    if dates:
+        mix.append(('leaderboard_as_of', 10, as_of))
+    if options is not None:
+        mix.append(('leaderboard_slice', 10, sliced))
+    return mix
+
+
+def client(api, mix, seed, deadline, samples, errors):
+    rng = random.Random(seed)
+    names = [name for name, _, _ in mix]
+    weights = [weight for _, weight, _ in mix]
+    makers = {name: make for name, _, make in mix}
+    while True:
+        name = rng.choices(names, weights)[0]
+        method, args, kwargs = makers[name](rng)
+        start = time.perf_counter()
+        if start >= deadline:
+            return
+        try:
+            getattr(api, method)(*args, **kwargs)
+        except Exception as exc:
+            errors.append(f"{name}: {type(exc).__name__}: {exc}")
+            continue
+        samples.append((name, start, time.perf_counter() - start))
+
+
+def run_load(api, clients=CLIENTS, duration=DURATION, warmup=WARMUP, seed=0):
+    """Latency samples of `clients` concurrent threads over warmup + duration seconds; samples
+    started during the warmup (cold loads and cache fills) are dropped."""
+    mix = query_mix(workload(api))
+    begin = time.perf_counter()
+    deadline = begin + warmup + duration
+    samples, errors = [], []  # list.append is atomic, so the threads share them
+    threads = [threading.Thread(target=client, args=(api, mix, seed + i, deadline, samples, errors))
+               for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    samples = pd.DataFrame(samples, columns=['query', 'start', 'seconds'])
+    return samples[samples['start'] >= begin + warmup], errors
+
+
+def summarize(samples, duration):
+    # Latency percentiles (ms) per query type and overall, with throughput (queries/s)
+    def row(seconds):
+        ms = seconds.to_numpy() * 1000
+        stats = {'count': len(ms), 'qps': len(ms) / duration}
+        for p, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES) if len(ms) else [np.nan] * len(PERCENTILES)):
+            stats[f"p{p}_ms"] = value
+        stats['max_ms'] = ms.max() if len(ms) else np.nan
+        return stats
+    table = pd.DataFrame({name: row(group['seconds']) for name, group in samples.groupby('query')}).T
+    table.loc['all'] = row(samples['seconds'])
+    table['count'] = table['count'].astype(int)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure query latency (p50/p95/p99) under concurrent clients.")
+    parser.add_argument('--url', help="Running query_server to test (default: start one on --data-dir)")
+    parser.add_argument('--data-dir', default='.', help="Pipeline outputs, when no --url is given")
+    parser.add_argument('--in-process', action='store_true', help="Call the query service directly, without HTTP")
+    parser.add_argument('--clients', type=int, default=CLIENTS, help="Concurrent client threads")
+    parser.add_argument('--duration', type=float, default=DURATION, help="Seconds measured")
+    parser.add_argument('--warmup', type=float, default=WARMUP, help="Seconds run before measuring")
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help="Cache size of a server started here")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="JSON results file")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        api, target = QueryClient(args.url), args.url
+    elif args.in_process:
+        api, target = QueryService(args.data_dir, args.cache_size), 'in-process'
+    else:
+        server = make_server(args.data_dir, port=0, cache_size=args.cache_size)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        target = f"http://127.0.0.1:{server.server_port}"
+        api = QueryClient(target)
+    try:
+        print(f"{args.clients} clients against {target} for {args.warmup:g}s warmup + {args.duration:g}s...")
+        samples, errors = run_load(api, args.clients, args.duration, args.warmup, args.seed)
+        cache = api.cache_stats()
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    table = summarize(samples, args.duration)
+    print(table.to_string(float_format=lambda value: f"{value:.2f}"))
+    lookups = cache['hits'] + cache['misses']
+    print(f"Cache: {cache['entries']}/{cache['maxsize']} entries, "
+          f"{cache['hits'] / lookups if lookups else 0:.1%} hits, {cache['evictions']} evictions")
+    if errors:
+        print(f"{len(errors)} failed queries, e.g. {errors[0]}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'target': target, 'clients': args.clients, 'duration': args.duration,
+                       'queries': table.reset_index(names='query').to_dict(orient='records'),
+                       'cache': cache, 'errors': len(errors)}, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
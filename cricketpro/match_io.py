@@ -0,0 +1,141 @@
+import os
+import json
+import zipfile
+from functools import lru_cache
+from typing import Dict, List, TypedDict, Union
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Reading Cricsheet matches: league sources may be folders of match JSON or the .zip archives
+# Cricsheet publishes, read member by member without extracting. A match inside an archive
+# is addressed as '<archive.zip>::<member.json>'.
+#
+# Decoding uses the fastest decoder installed: msgspec with the typed schema below (only
+# the fields the pipeline reads are decoded, everything else is skipped), then orjson, then
+# the standard library. All three produce the same dicts for the fields parse_match uses.
+ZIP_MEMBER = '::'
+
+
+class Runs(TypedDict, total=False):
+    batter: int
+    total: int
+
+
+class Fielder(TypedDict, total=False):
+    name: str
+
+
+class Wicket(TypedDict, total=False):
+    kind: str
+    player_out: str
+    fielders: Union[List[Union[Fielder, str]], Fielder]
+
+
+class Delivery(TypedDict, total=False):
+    batter: str
+    bowler: str
+    runs: Runs
+    wickets: List[Wicket]
+
+
+class Over(TypedDict, total=False):
+    over: int
+    deliveries: List[Delivery]
+
+
+class Innings(TypedDict, total=False):
+    team: str
+    overs: List[Over]
+
+
+class Registry(TypedDict, total=False):
+    people: Dict[str, str]  # display name -> Cricsheet person id
+
+
+class Info(TypedDict, total=False):
+    dates: Union[List[str], str]
+    match_type: str
+    registry: Registry
+
+
+class Match(TypedDict, total=False):
+    info: Info
+    innings: List[Innings]
+
+
+MATCH_DECODER = msgspec.json.Decoder(Match) if msgspec is not None else None
+
+
+def decode_match(data):
+    # bytes of one match file -> dict with (at least) the fields parse_match reads
+    if MATCH_DECODER is not None:
+        try:
+            return MATCH_DECODER.decode(data)
+        except msgspec.ValidationError:
+            pass  # a field of an unexpected type: decode generically instead
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def is_archive(source):
+    return source.lower().endswith('.zip') and os.path.isfile(source)
+
+
+def list_source(source):
+    # Match paths in a league folder or archive, in listing order
+    if is_archive(source):
+        return [f"{source}{ZIP_MEMBER}{name}" for name in archive_members(source, os.stat(source).st_mtime_ns)
+                if name.endswith('.json')]
+    return [os.path.join(source, fname) for fname in os.listdir(source) if fname.endswith('.json')]
+
+
+@lru_cache(maxsize=64)
+def archive_members(archive_path, mtime_ns):
+    # {member name: ZipInfo}, in archive order; mtime_ns keys the cache to the archive version
+    with zipfile.ZipFile(archive_path) as archive:
+        return {info.filename: info for info in archive.infolist()}
+
+
+def file_stamp(path):
+    # (size, stamp) for change detection: the mtime in ns for files, the CRC-32 for archive members
+    archive_path, sep, member = path.partition(ZIP_MEMBER)
+    if not sep:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    info = archive_members(archive_path, os.stat(archive_path).st_mtime_ns)[member]
+    return info.file_size, info.CRC
+
+
+class MatchReader:
+    # Reads match files and archive members; each archive is opened once per reader
+    def __init__(self):
+        self.archives = {}
+
+    def read(self, path):
+        archive_path, sep, member = path.partition(ZIP_MEMBER)
+        if not sep:
+            with open(path, 'rb') as f:
+                return f.read()
+        archive = self.archives.get(archive_path)
+        if archive is None:
+            archive = self.archives[archive_path] = zipfile.ZipFile(archive_path)
+        return archive.read(member)
+
+    def close(self):
+        for archive in self.archives.values():
+            archive.close()
+        self.archives = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,124 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Batter-vs-bowler head-to-head totals (runs, balls, dismissals) for every pair that ever
+# met, never a dense players x players matrix. Pairs are held like a CSR sparse matrix:
+# sorted by (batter, bowler) with one row-pointer per batter, plus a permutation ordering
+# the same pairs by bowler. A lookup is a dict hit for each name and a binary search inside
+# one batter's row, which only holds the bowlers they faced.
+MATCHUPS = 'matchups.npz'
+MEASURES = ['runs', 'balls', 'dismissals']
+
+
+def sum_pairs(batters, bowlers, values):
+    # Sums the rows of `values` (measures x rows) per (batter, bowler) code pair; returns
+    # the distinct pairs sorted by (batter, bowler) and their totals
+    if len(batters) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros((len(values), 0), dtype=np.int64)
+    width = int(max(batters.max(), bowlers.max())) + 1
+    pairs, inverse = np.unique(batters.astype(np.int64) * width + bowlers, return_inverse=True)
+    inverse = inverse.ravel()
+    totals = np.stack([np.bincount(inverse, weights=row, minlength=len(pairs)) for row in values])
+    return pairs // width, pairs % width, totals.astype(np.int64)
+
+
+def delivery_pairs(batters, bowlers, runs, dismissals):
+    # (players, batters, bowlers, totals) of row-aligned delivery columns, pairs coded into players
+    codes, players = pd.factorize(np.concatenate([np.asarray(batters, dtype=object),
+                                                  np.asarray(bowlers, dtype=object)]))
+    n = len(batters)
+    values = np.stack([np.asarray(runs), np.ones(n, dtype=np.int64), np.asarray(dismissals)])
+    return (np.asarray(players, dtype=object), *sum_pairs(codes[:n], codes[n:], values))
+
+
+class MatchupIndex:
+    def __init__(self, players, batters, bowlers, totals):
+        # players: code -> name; batters/bowlers: pair codes sorted by (batter, bowler)
+        self.players = np.asarray(players, dtype=object)
+        self.codes = {name: code for code, name in enumerate(self.players)}
+        self.batters = batters
+        self.bowlers = bowlers
+        self.totals = totals
+        n = len(self.players)
+        self.indptr = np.searchsorted(batters, np.arange(n + 1))
+        self.by_bowler = np.lexsort((batters, bowlers))
+        self.bowler_indptr = np.searchsorted(bowlers[self.by_bowler], np.arange(n + 1))
+
+    @classmethod
+    def from_deliveries(cls, batters, bowlers, runs, dismissals):
+        """Builds the index from row-aligned delivery columns (striker and bowler names per ball)."""
+        return cls(*delivery_pairs(batters, bowlers, runs, dismissals))
+
+    @classmethod
+    def from_frames(cls, bat_df, bowl_df):
+        # From the pipeline's row-aligned bat/bowl delivery tables (see ingest.py)
+        if bat_df.empty:
+            return cls.from_deliveries([], [], [], [])
+        return cls.from_deliveries(bat_df['player'].to_numpy(), bowl_df['player'].to_numpy(),
+                                   bat_df['runs'].to_numpy(), bat_df['dismissal'].to_numpy())
+
+    @classmethod
+    def from_pairs(cls, players, batters, bowlers, totals):
+        # Partial pair totals in any order, e.g. one set per chunk; repeated pairs are summed
+        return cls(players, *sum_pairs(batters, bowlers, totals))
+
+    @classmethod
+    def from_parts(cls, parts):
+        """Merges delivery_pairs() results that each code players their own way, e.g. one per
+        player shard; players are numbered in sorted order."""
+        parts = [part for part in parts if len(part[0])]
+        if not parts:
+            return cls.from_deliveries([], [], [], [])
+        players, codes = np.unique(np.concatenate([part[0] for part in parts]), return_inverse=True)
+        bounds = np.cumsum([0] + [len(part[0]) for part in parts])
+        remaps = [codes[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+        return cls.from_pairs(players, np.concatenate([remap[part[1]] for remap, part in zip(remaps, parts)]),
+                              np.concatenate([remap[part[2]] for remap, part in zip(remaps, parts)]),
+                              np.hstack([part[3] for part in parts]))
+
+    def __len__(self):
+        return len(self.batters)
+
+    def head_to_head(self, batter, bowler):
+        # {'runs', 'balls', 'dismissals'} for batter facing bowler, or None if they never met
+        b, w = self.codes.get(batter), self.codes.get(bowler)
+        if b is None or w is None:
+            return None
+        start, end = self.indptr[b], self.indptr[b + 1]
+        pos = start + np.searchsorted(self.bowlers[start:end], w)
+        if pos == end or self.bowlers[pos] != w:
+            return None
+        return dict(zip(MEASURES, self.totals[:, pos].tolist()))
+
+    def table(self, rows, other, other_name):
+        frame = pd.DataFrame(self.totals[:, rows].T, columns=MEASURES,
+                             index=pd.Index(self.players[other[rows]], name=other_name))
+        frame['strike_rate'] = frame['runs'] / frame['balls'] * 100
+        frame['average'] = frame['runs'] / frame['dismissals'].replace(0, np.nan)
+        return frame.sort_values('balls', ascending=False)
+
+    def batter_matchups(self, batter):
+        # Every bowler the batter faced, most balls first
+        b = self.codes.get(batter)
+        rows = np.arange(0) if b is None else np.arange(self.indptr[b], self.indptr[b + 1])
+        return self.table(rows, self.bowlers, 'bowler')
+
+    def bowler_matchups(self, bowler):
+        # Every batter the bowler bowled to, most balls first
+        w = self.codes.get(bowler)
+        rows = np.arange(0) if w is None else self.by_bowler[self.bowler_indptr[w]:self.bowler_indptr[w + 1]]
+        return self.table(rows, self.batters, 'batter')
+
+    def save(self, path):
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, players=self.players.astype(str), batters=self.batters.astype(np.int32),
+                            bowlers=self.bowlers.astype(np.int32), totals=self.totals.astype(np.int32))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['players'].astype(object), data['batters'].astype(np.int64),
+                       data['bowlers'].astype(np.int64), data['totals'].astype(np.int64))
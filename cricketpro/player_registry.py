@@ -0,0 +1,228 @@
+import os
+import re
+import argparse
+import unicodedata
+import numpy as np
+import pandas as pd
+
+# Player identities from Cricsheet's info.registry.people: every match file maps the display
+# names it uses to stable person ids. The registry has one row per (player_id, name) pair, so
+# one name shared by two people shows up as two rows, and one person listed under two names
+# (e.g. a renamed or re-spelled player in another league) as two rows with the same id.
+# Careers are keyed by player key (ingest.py): the id, or for players no match registry lists,
+# the name, which gets a row with an empty id.
+#
+# Search uses two indexes built when the registry is loaded: a sorted array of every name
+# and every name suffix starting at a word ("kohli" for "v kohli"), where a prefix is one
+# binary search, and a character-trigram inverted index for misspelled queries.
+REGISTRY = 'player_registry.parquet'
+COLUMNS = ['player_id', 'player', 'leagues', 'matches', 'first_match', 'last_match']
+SEARCH_LIMIT = 10
+MIN_SIMILARITY = 0.25  # trigram overlap (Jaccard) below which a fuzzy match is dropped
+
+
+def normalize(name):
+    # Lowercase ASCII words: 'Mohammed Shami' / 'mohammed  shami' / 'Mohammed Shamí' -> 'mohammed shami'
+    text = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text.lower()).split())
+
+
+def trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def registry_part(people):
+    # Appearances per (player_id, player, league) from people rows (one per name per match)
+    frame = pd.DataFrame({name: np.asarray(people[name], dtype=object) for name in ['player_id', 'player', 'league']})
+    # Each distinct date string is parsed once
+    codes, dates = pd.factorize(np.asarray(people['date'], dtype=object))
+    frame['date'] = pd.to_datetime(pd.Series(dates, dtype=object), errors='coerce').to_numpy()[codes]
+    return frame.groupby(['player_id', 'player', 'league'], sort=False).agg(
+        matches=('date', 'size'), first_match=('date', 'min'), last_match=('date', 'max')).reset_index()
+
+
+def merge_registry(parts, names=()):
+    """Combines registry parts into the registry table; `names` are the player keys seen in
+    deliveries, so players from files without a registry can still be searched."""
+    parts = [part for part in parts if len(part)]
+    if parts:
+        merged = pd.concat(parts, ignore_index=True).groupby(['player_id', 'player', 'league']).agg(
+            matches=('matches', 'sum'), first_match=('first_match', 'min'), last_match=('last_match', 'max'))
+        merged = merged.reset_index()  # sorted, so each player's leagues come out in order
+        table = merged.groupby(['player_id', 'player']).agg(
+            leagues=('league', ', '.join), matches=('matches', 'sum'),
+            first_match=('first_match', 'min'), last_match=('last_match', 'max')).reset_index()
+    else:
+        table = pd.DataFrame({name: pd.Series(dtype=object) for name in COLUMNS[:3]})
+        table['matches'] = np.zeros(0, dtype=np.int64)
+        table['first_match'] = table['last_match'] = np.zeros(0, dtype='datetime64[ns]')
+    unregistered = sorted(set(names) - set(table['player_id']))
+    if unregistered:
+        table = pd.concat([table, pd.DataFrame({
+            'player_id': '', 'player': unregistered, 'leagues': '', 'matches': 0,
+            'first_match': pd.NaT, 'last_match': pd.NaT
+        })], ignore_index=True)
+    table['matches'] = table['matches'].astype(np.int64)
+    return table.sort_values(['player', 'player_id'], kind='stable').reset_index(drop=True)[COLUMNS]
+
+
+def player_keys(table):
+    # Career key of each registry row: its Cricsheet id, or the name of an unregistered player
+    ids = table['player_id'].to_numpy(dtype=object)
+    return np.where(ids != '', ids, table['player'].to_numpy(dtype=object))
+
+
+def display_names(table):
+    """Name shown for each player key: a Cricsheet id's most-played name (the later one on a
+    tie), an unregistered player's own name."""
+    ranked = table.assign(key=player_keys(table)).sort_values(['matches', 'last_match'], kind='stable')
+    ranked = ranked.drop_duplicates('key', keep='last')
+    return pd.Series(ranked['player'].to_numpy(dtype=object), index=ranked['key'].to_numpy(dtype=object))
+
+
+def combine_registries(tables):
+    # merge_registry() tables of disjoint sets of names (e.g. one per player shard) as one table
+    table = pd.concat([table for table in tables if len(table)] or tables[:1], ignore_index=True)
+    return table.sort_values(['player', 'player_id'], kind='stable').reset_index(drop=True)
+
+
+def build_registry(people_df, names=()):
+    return PlayerRegistry(merge_registry([registry_part(people_df)] if not people_df.empty else [], names))
+
+
+class PlayerRegistry:
+    def __init__(self, table):
+        self.table = table.reset_index(drop=True)
+        self.players = self.table['player'].to_numpy(dtype=object)
+        self.ids = self.table['player_id'].to_numpy(dtype=object)
+        self.matches = self.table['matches'].to_numpy(dtype=np.int64)
+        self.names = display_names(self.table).to_dict()
+        self.rows_by_name = {}
+        self.rows_by_id = {}
+        for row, (name, player_id) in enumerate(zip(self.players, self.ids)):
+            self.rows_by_name.setdefault(name, []).append(row)
+            if player_id:
+                self.rows_by_id.setdefault(player_id, []).append(row)
+        # Most-played first: the default ranking of search results
+        self.popular = np.lexsort((np.arange(len(self.table)), -self.matches))
+        self.rank = np.empty(len(self.table), dtype=np.int64)
+        self.rank[self.popular] = np.arange(len(self.table))
+
+        keys, key_rows, grams = [], [], {}
+        self.gram_counts = np.zeros(len(self.table), dtype=np.int64)
+        for row, name in enumerate(self.players):
+            words = normalize(name).split()
+            for start in range(len(words)):
+                keys.append(' '.join(words[start:]))
+                key_rows.append(row)
+            name_grams = trigrams(' '.join(words))
+            self.gram_counts[row] = len(name_grams)
+            for gram in name_grams:
+                grams.setdefault(gram, []).append(row)
+        order = np.argsort(np.asarray(keys, dtype=str), kind='stable')
+        self.prefix_keys = np.asarray(keys, dtype=str)[order]
+        self.prefix_rows = np.asarray(key_rows, dtype=np.int64)[order]
+        self.grams = {gram: np.asarray(rows, dtype=np.int64) for gram, rows in grams.items()}
+
+    def __len__(self):
+        return len(self.table)
+
+    def prefix_matches(self, query):
+        # Rows with a word-aligned prefix match, most-played first
+        lo, hi = np.searchsorted(self.prefix_keys, [query, query + '\uffff'])
+        rows = np.unique(self.prefix_rows[lo:hi])
+        return rows[np.argsort(self.rank[rows], kind='stable')]
+
+    def fuzzy_matches(self, query, limit):
+        # Rows sharing enough trigrams with the query, most similar first
+        query_grams = [gram for gram in trigrams(query) if gram in self.grams]
+        if not query_grams:
+            return np.zeros(0, dtype=np.int64)
+        rows, hits = np.unique(np.concatenate([self.grams[gram] for gram in query_grams]), return_counts=True)
+        similarity = hits / (len(trigrams(query)) + self.gram_counts[rows] - hits)
+        keep = similarity >= MIN_SIMILARITY
+        rows, similarity = rows[keep], similarity[keep]
+        return rows[np.lexsort((self.rank[rows], -similarity))][:limit]
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Up to `limit` registry rows for a typed query: word-prefix matches first, then fuzzy
+        matches for misspellings; an empty query lists the most-played players."""
+        query = normalize(query)
+        if not query:
+            return self.table.iloc[self.popular[:limit]]
+        rows = self.prefix_matches(query)[:limit]
+        if len(rows) < limit:
+            fuzzy = self.fuzzy_matches(query, limit)
+            rows = np.concatenate([rows, fuzzy[~np.isin(fuzzy, rows)]])[:limit]
+        return self.table.iloc[rows]
+
+    def ids_for(self, name):
+        # Cricsheet ids behind a display name; more than one means the name is shared
+        return [self.ids[row] for row in self.rows_by_name.get(name, []) if self.ids[row]]
+
+    def name(self, key):
+        # Display name of a player key
+        return self.names.get(key, key)
+
+    def names_for(self, player_id):
+        # Every display name a person appears under
+        return [self.players[row] for row in self.rows_by_id.get(player_id, [])]
+
+    def collisions(self):
+        # Names shared by more than one person
+        ids = self.table[self.table['player_id'] != '']
+        counts = ids.groupby('player')['player_id'].nunique()
+        return ids[ids['player'].isin(counts.index[counts > 1])]
+
+    def variants(self):
+        # People listed under more than one name
+        ids = self.table[self.table['player_id'] != '']
+        counts = ids.groupby('player_id')['player'].nunique()
+        return ids[ids['player_id'].isin(counts.index[counts > 1])]
+
+    def label(self, row):
+        # Search result text: name, leagues and matches; the id is added when the name is shared
+        entry = self.table.iloc[row]
+        label = entry['player']
+        if len(self.ids_for(entry['player'])) > 1:
+            label += f" [{entry['player_id']}]"
+        if entry['matches']:
+            label += f" ({entry['leagues']}, {entry['matches']} matches)"
+        return label
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        self.table.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        return cls(pd.read_parquet(path))
+
+    @classmethod
+    def from_names(cls, names):
+        # Registry without ids, for outputs written before the registry existed
+        return cls(merge_registry([], names))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the player registry and list identity conflicts.")
+    parser.add_argument('query', nargs='?', default='')
+    parser.add_argument('--registry', default=REGISTRY)
+    parser.add_argument('--limit', type=int, default=SEARCH_LIMIT)
+    parser.add_argument('--collisions', action='store_true', help="Names shared by more than one Cricsheet id")
+    parser.add_argument('--variants', action='store_true', help="Cricsheet ids listed under more than one name")
+    args = parser.parse_args()
+
+    registry = PlayerRegistry.load(args.registry)
+    if args.collisions:
+        print(registry.collisions().to_string(index=False))
+    elif args.variants:
+        print(registry.variants().to_string(index=False))
+    else:
+        print(registry.search(args.query, args.limit).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,346 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from snapshot import read_table, export_bytes, EXPORT_FORMATS
+from history_index import PlayerIndex
+from downsample import downsample_history
+from rating_store import RatingStore
+from elo_checkpoints import KINDS
+from matchups import MatchupIndex, MATCHUPS
+from rollup import RollupCube, CUBE
+from player_registry import PlayerRegistry, REGISTRY, SEARCH_LIMIT
+
+# Read-only queries over the pipeline outputs, independent of Streamlit: leaderboards (career,
+# as of a date, or over a league/season/phase slice), player search and profiles, Elo
+# trajectories, comparisons and exports. Outputs are loaded once per process on first use;
+# computed results go through one bounded LRU cache. Every method is safe to call from many
+# threads at once (query_server.py serves them over HTTP). Returned frames are shared with
+# the cache and must not be modified. Players are addressed by player key (ingest.py: Cricsheet
+# id, or name when unregistered); tables carry the display name in a 'name' column.
+CACHE_SIZE = 1024
+PAGE_SIZE = 100
+
+# kind -> stats table, elite table, Elo column and the career columns shown
+LEADERBOARDS = {
+    'batting': ('batting_stats', 'elite_batters', 'batting_elo',
+                ['batting_elo', 'total_runs', 'matches_played', 'bat_avg', 'strike_rate', 'milestone_1000_runs']),
+    'bowling': ('bowling_stats', 'elite_bowlers', 'bowling_elo',
+                ['bowling_elo', 'total_wickets', 'matches_2plus_overs', 'bowling_avg', 'economy', 'wickets_per_match',
+                 'milestone_100_wickets']),
+    'allrounder': ('allrounder_stats', 'elite_allrounders', 'allrounder_elo',
+                   ['allrounder_elo', 'batting_elo', 'bowling_elo', 'total_runs', 'total_wickets', 'matches_played',
+                    'matches_2plus_overs'])
+}
+# kind -> Elo columns kept, rollup measures shown, measures a player needs in the slice, rank column
+SLICES = {
+    'batting': (['batting_elo'], ['runs', 'balls_faced', 'strike_rate'], ['balls_faced'], 'runs'),
+    'bowling': (['bowling_elo'], ['wickets', 'balls_bowled', 'runs_conceded', 'bowling_average', 'economy'],
+                ['balls_bowled'], 'wickets'),
+    'allrounder': (['allrounder_elo', 'batting_elo', 'bowling_elo'], ['runs', 'strike_rate', 'wickets', 'economy'],
+                   ['balls_faced', 'balls_bowled'], 'allrounder_elo')
+}
+# Output tables served by name (table, export); other names are rejected, not read from disk
+OUTPUT_TABLES = ('batting_stats', 'bowling_stats', 'allrounder_stats', 'fielding_stats', 'elite_batters',
+                 'elite_bowlers', 'elite_allrounders')
+BATTING_COLUMNS = LEADERBOARDS['batting'][3]
+BOWLING_COLUMNS = LEADERBOARDS['bowling'][3]
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache holding at most `maxsize` entries."""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, compute):
+        # Cached value for key, computing it on a miss; the computation runs outside the lock,
+        # so a slow miss never blocks hits (two threads may compute the same key once each)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+        value = compute()
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'maxsize': self.maxsize, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def filter_key(leagues, seasons, phases):
+    return tuple(tuple(sorted(values)) if values else () for values in (leagues, seasons, phases))
+
+
+class QueryService:
+    # Names of the methods query_server.py exposes
+    QUERIES = ('table', 'leaderboard', 'rating_range', 'slice_options', 'search', 'player', 'trajectory',
+               'compare', 'top_players', 'names', 'export', 'cache_stats')
+
+    def __init__(self, data_dir='.', cache_size=CACHE_SIZE):
+        self.data_dir = data_dir
+        self.cache = LRUCache(cache_size)
+        self.resources = {}
+        self.load_lock = threading.RLock()  # loaders call resource() for their inputs
+
+    # --- Loaded outputs (once per process) ---
+
+    def resource(self, key, load):
+        value = self.resources.get(key)
+        if value is None:
+            with self.load_lock:
+                value = self.resources.get(key)
+                if value is None:
+                    value = self.resources[key] = load()
+        return value
+
+    def output(self, name):
+        # A pipeline output table; FileNotFoundError if the pipeline has not written it
+        if name not in OUTPUT_TABLES:
+            raise ValueError(f"Unknown output table: {name}")
+        return self.resource(('table', name), lambda: read_table(self.data_dir, name))
+
+    def sorted_output(self, name, sort_col):
+        return self.resource(('sorted', name), lambda: self.output(name).sort_values(sort_col, ascending=False))
+
+    def history(self, kind):
+        # Per-player index over an Elo history; empty if the history file is missing
+        name_col, _, history_file = KINDS[kind]
+
+        def load():
+            try:
+                hist = read_table(self.data_dir, history_file[:-len('.csv')], indexed=False)
+            except FileNotFoundError:
+                hist = pd.DataFrame()
+            return PlayerIndex(hist, name_col)
+        return self.resource(('history', kind), load)
+
+    def rating_store(self, kind):
+        # Date-indexed ratings; False (not None, which means "not loaded") without a history
+        name_col, rating_col, _ = KINDS[kind]
+
+        def load():
+            rows = self.history(kind).rows
+            return RatingStore(rows, name_col, rating_col) if name_col in rows.columns else False
+        return self.resource(('ratings', kind), load) or None
+
+    def optional(self, filename, load):
+        path = os.path.join(self.data_dir, filename)
+        return self.resource(('file', filename), lambda: load(path) if os.path.exists(path) else False) or None
+
+    def matchups(self):
+        return self.optional(MATCHUPS, MatchupIndex.load)
+
+    def cube(self):
+        return self.optional(CUBE, RollupCube.load)
+
+    def registry(self):
+        # Older outputs without a registry get a name-only one from the stats tables
+        def load():
+            path = os.path.join(self.data_dir, REGISTRY)
+            if os.path.exists(path):
+                return PlayerRegistry.load(path)
+            return PlayerRegistry.from_names(sorted(set(self.output('batting_stats').index) |
+                                                    set(self.output('bowling_stats').index)))
+        return self.resource(('registry',), load)
+
+    # --- Queries ---
+
+    def table(self, name, columns=None):
+        """A whole output table, optionally limited to some columns (e.g. for charts)."""
+        table = self.output(name)
+        if not columns:
+            return table
+        return self.cache.get(('table', name, tuple(columns)), lambda: table[list(columns)])
+
+    def leaderboard(self, kind, elite=True, page=1, page_size=PAGE_SIZE, as_of=None, leagues=None, seasons=None,
+                    phases=None):
+        """One page of a leaderboard: {'rows': frame, 'total': row count}.
+
+        With any of leagues/seasons/phases, players are ranked on their totals over that slice
+        of the rollup cube (next to career Elo); otherwise with as_of on their ratings as of
+        that date; otherwise on career Elo.
+        """
+        stats_name, elite_name, elo_col, columns = LEADERBOARDS[kind]
+        name = elite_name if elite else stats_name
+        filters = filter_key(leagues, seasons, phases)
+        if any(filters):
+            ranked = self.cache.get(('slice', name, kind, filters), lambda: self.sliced(name, kind, *filters))
+        elif as_of:
+            as_of = str(pd.Timestamp(as_of).date())
+            ranked = self.cache.get(('as_of', name, kind, as_of), lambda: self.ratings_as_of(name, kind, as_of))
+        else:
+            ranked = self.sorted_output(name, elo_col)
+            ranked = ranked[[col for col in ['name', *columns] if col in ranked.columns]]
+        start = (max(int(page), 1) - 1) * page_size
+        return {'rows': ranked.iloc[start:start + page_size], 'total': len(ranked)}
+
+    def sliced(self, name, kind, leagues, seasons, phases):
+        # Totals of the table's players over the slice, next to their career Elo; players with
+        # none of the required balls in the slice are left out
+        elo_cols, cols, active, sort_col = SLICES[kind]
+        cube = self.cube()
+        if cube is None:
+            raise FileNotFoundError(os.path.join(self.data_dir, CUBE))
+        totals = cube.query(leagues=list(leagues), seasons=list(seasons), phases=list(phases))
+        totals = totals[(totals[active] > 0).all(axis=1)]
+        table = self.output(name)
+        table = table[[col for col in ['name', *elo_cols] if col in table.columns]]
+        return table.join(totals[cols], how='inner').sort_values(sort_col, ascending=False)
+
+    def ratings_as_of(self, name, kind, as_of):
+        # Elo and form of the table's players as of the date (players yet to debut are left out)
+        table = self.output(name)
+        if kind != 'allrounder':
+            elo_col = KINDS[kind][1]
+            ratings = self.rating_store(kind).as_of(as_of).rename(columns={'rating': elo_col})
+            ratings = ratings[ratings.index.isin(table.index)]
+        else:
+            elo_col = 'allrounder_elo'
+            bat = self.rating_store('batting').as_of(as_of)
+            bowl = self.rating_store('bowling').as_of(as_of)
+            ratings = bat[['rating', 'matches']].rename(columns={'rating': 'batting_elo'}).join(
+                bowl[['rating', 'matches']].rename(columns={'rating': 'bowling_elo'}),
+                how='inner', lsuffix='_batting', rsuffix='_bowling')
+            ratings = ratings[ratings.index.isin(table.index)]
+            ratings.insert(0, elo_col, np.sqrt(ratings['batting_elo'] * ratings['bowling_elo']))
+        if 'name' in table.columns:
+            ratings.insert(0, 'name', table['name'].reindex(ratings.index).to_numpy())
+        return ratings.sort_values(elo_col, ascending=False)
+
+    def rating_range(self, kind):
+        """(first, last) dates with ratings as 'YYYY-MM-DD', or None without Elo histories."""
+        stores = [self.rating_store(k) for k in (['batting', 'bowling'] if kind == 'allrounder' else [kind])]
+        if any(store is None for store in stores):
+            return None
+        date_range = stores[0].date_range()
+        return None if date_range is None else [str(date.date()) for date in date_range]
+
+    def slice_options(self):
+        # Values for the league / season / phase filters, or None without a rollup cube
+        cube = self.cube()
+        if cube is None:
+            return None
+        return {'leagues': cube.options('league'), 'seasons': cube.options('season'), 'phases': cube.options('phase')}
+
+    def search(self, query='', limit=SEARCH_LIMIT):
+        """Top registry matches for a typed query, with a display label per row."""
+        registry = self.registry()
+
+        def run():
+            matches = registry.search(query, limit).copy()
+            matches['label'] = [registry.label(row) for row in matches.index]
+            return matches
+        return self.cache.get(('search', query.strip().lower(), limit), run)
+
+    def player(self, player):
+        """Stats and identity of one player (a player key): display name, batting / bowling rows,
+        non-zero fielding counts, other names of the same Cricsheet id and every id sharing the
+        display name."""
+        def run():
+            batting, bowling = self.output('batting_stats'), self.output('bowling_stats')
+            fielding = self.output('fielding_stats')
+            registry = self.registry()
+            name = registry.name(player)
+            profile = {
+                'name': name,
+                'batting': batting.loc[[player], BATTING_COLUMNS] if player in batting.index else None,
+                'bowling': bowling.loc[[player], BOWLING_COLUMNS] if player in bowling.index else None,
+                'fielding': None,
+                'also': [other for other in registry.names_for(player) if other != name],
+                'shared_ids': registry.ids_for(name)
+            }
+            if player in fielding.index:
+                stats = fielding.loc[[player]].drop(columns='name', errors='ignore')
+                profile['fielding'] = stats.loc[:, (stats != 0).any(axis=0)]
+            return profile
+        return self.cache.get(('player', player), run)
+
+    def trajectory(self, kind, player, full_resolution=False):
+        """One player's Elo over time (date and Elo columns), downsampled unless full_resolution."""
+        _, rating_col, _ = KINDS[kind]
+
+        def run():
+            hist = self.history(kind).get(player)
+            if hist.empty:
+                return pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]'), rating_col: pd.Series(dtype=float)})
+            hist = hist if full_resolution else downsample_history(hist, rating_col)
+            return hist[['date', rating_col]].reset_index(drop=True)
+        return self.cache.get(('trajectory', kind, player, bool(full_resolution)), run)
+
+    def compare(self, player1, player2):
+        """Side-by-side career stats and, when the matchup index exists, the head-to-head record
+        ('head_to_head' is None without an index and an empty frame if they never met)."""
+        def run():
+            batting, bowling = self.output('batting_stats'), self.output('bowling_stats')
+            names = self.names([player1, player2])
+            stats = []
+            for player in [player1, player2]:
+                bat = batting.loc[player] if player in batting.index else None
+                bowl = bowling.loc[player] if player in bowling.index else None
+                stats.append({
+                    "Batting Elo": bat['batting_elo'] if bat is not None else None,
+                    "Total Runs": bat['total_runs'] if bat is not None else None,
+                    "Bat Avg": bat['bat_avg'] if bat is not None else None,
+                    "Strike Rate": bat['strike_rate'] if bat is not None else None,
+                    "Bowling Elo": bowl['bowling_elo'] if bowl is not None else None,
+                    "Total Wickets": bowl['total_wickets'] if bowl is not None else None,
+                    "Bowling Avg": bowl['bowling_avg'] if bowl is not None else None,
+                    "Economy": bowl['economy'] if bowl is not None else None
+                })
+            matchups = self.matchups()
+            h2h = None
+            if matchups is not None:
+                h2h = {}
+                for (batter, bowler), (bat_name, bowl_name) in [((player1, player2), names),
+                                                                ((player2, player1), names[::-1])]:
+                    totals = matchups.head_to_head(batter, bowler)
+                    if totals is not None:
+                        h2h[f"{bat_name} batting vs {bowl_name}"] = {
+                            "Runs": totals['runs'],
+                            "Balls": totals['balls'],
+                            "Dismissals": totals['dismissals'],
+                            "Strike Rate": totals['runs'] / totals['balls'] * 100,
+                            "Average": totals['runs'] / totals['dismissals'] if totals['dismissals'] else None
+                        }
+                h2h = pd.DataFrame.from_dict(h2h, orient='index')
+            return {'stats': pd.DataFrame(stats, index=names), 'head_to_head': h2h}
+        return self.cache.get(('compare', player1, player2), run)
+
+    def top_players(self, kind, n=20):
+        # Player keys of the n highest career Elo ratings
+        stats_name, _, elo_col, _ = LEADERBOARDS[kind]
+        return self.sorted_output(stats_name, elo_col).head(n).index.tolist()
+
+    def names(self, players):
+        # Display names of player keys
+        registry = self.registry()
+        return [registry.name(player) for player in players]
+
+    def export(self, name, fmt):
+        """An output table serialized in one of snapshot.EXPORT_FORMATS, built on first request."""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        return self.cache.get(('export', name, fmt), lambda: export_bytes(self.output(name), fmt))
+
+    def cache_stats(self):
+        return self.cache.stats()
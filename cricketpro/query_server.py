@@ -0,0 +1,189 @@
+import json
+import base64
+import inspect
+import argparse
+import datetime
+import threading
+import http.client
+from urllib.parse import urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import pandas as pd
+from query_api import QueryService, CACHE_SIZE
+
+# Local HTTP front end for query_api.QueryService: one process holds the outputs and the
+# cache, and any number of dashboards or scripts query it concurrently (one thread per
+# request). Every query is POST /api/<method> with its keyword arguments as a JSON object;
+# GET /health answers without touching the data. QueryClient has the same methods as
+# QueryService, so callers switch between in-process and HTTP without other changes.
+HOST = '127.0.0.1'
+PORT = 8765
+TIMEOUT = 60
+
+
+def encode(value):
+    # Query results to JSON-safe values; frames travel as rows plus their dtypes (pandas'
+    # table schema would keep those too but takes several times longer to read back), with
+    # the index, possibly with repeated labels, as leading columns
+    if isinstance(value, pd.DataFrame):
+        flat = value.reset_index()
+        return {'__frame__': json.loads(flat.to_json(orient='split', index=False, date_format='iso')),
+                '__dtypes__': [str(dtype) for dtype in flat.dtypes],
+                '__index__': list(flat.columns[:value.index.nlevels]), '__names__': list(value.index.names)}
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, dict):
+        return {key: encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def decode(value):
+    if isinstance(value, dict):
+        if '__frame__' in value:
+            split = value['__frame__']
+            frame = pd.DataFrame(split['data'], columns=split['columns'])
+            frame = frame.astype(dict(zip(split['columns'], value['__dtypes__']))).set_index(value['__index__'])
+            frame.index.names = value['__names__']
+            return frame
+        if '__bytes__' in value:
+            return base64.b64decode(value['__bytes__'])
+        return {key: decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    return value
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so a client reuses its connection
+    # Headers and body go out as two writes; without TCP_NODELAY the second waits ~40 ms for
+    # the client's delayed ACK
+    disable_nagle_algorithm = True
+    service = None
+    verbose = False
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.reply(200, {'status': 'ok', 'data_dir': self.service.data_dir})
+        else:
+            self.reply(404, {'error': f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        prefix, _, method = self.path.partition('/api/')
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length) if length else b''
+        if prefix or method not in QueryService.QUERIES:
+            self.reply(404, {'error': f"Unknown query: {self.path}"})
+            return
+        try:
+            kwargs = json.loads(body) if body else {}
+            result = getattr(self.service, method)(**kwargs)
+        except FileNotFoundError as exc:
+            self.reply(404, {'error': str(exc)})
+        except (KeyError, ValueError, TypeError) as exc:
+            self.reply(400, {'error': f"{type(exc).__name__}: {exc}"})
+        except Exception as exc:
+            self.reply(500, {'error': f"{type(exc).__name__}: {exc}"})
+        else:
+            self.reply(200, {'result': encode(result)})
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(data_dir='.', host=HOST, port=PORT, cache_size=CACHE_SIZE, verbose=False):
+    handler = type('Handler', (QueryHandler,), {'service': QueryService(data_dir, cache_size), 'verbose': verbose})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+class QueryClient:
+    """QueryService over HTTP: same method names and return values, served by a query_server.
+
+    Each thread keeps its own keep-alive connection, so one client can be shared by threads.
+    """
+
+    def __init__(self, url=f"http://{HOST}:{PORT}", timeout=TIMEOUT):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def call(self, method, **kwargs):
+        body = json.dumps(encode(kwargs)).encode('utf-8')
+        for attempt in range(2):
+            conn = self.connection()
+            try:
+                conn.request('POST', f"/api/{method}", body, {'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                payload = json.loads(response.read())
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # The server dropped an idle connection: reconnect once
+                conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+        if response.status == 200:
+            return decode(payload['result'])
+        message = payload.get('error', response.reason)
+        if response.status == 404:
+            raise FileNotFoundError(message)
+        if response.status == 400:
+            raise ValueError(message)
+        raise RuntimeError(message)
+
+    def __getattr__(self, method):
+        if method not in QueryService.QUERIES:
+            raise AttributeError(method)
+        signature = inspect.signature(getattr(QueryService, method))
+
+        def query(*args, **kwargs):
+            arguments = signature.bind(None, *args, **kwargs).arguments  # None stands in for self
+            arguments.pop('self')
+            return self.call(method, **arguments)
+        return query
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve pipeline outputs to dashboards and scripts over local HTTP.")
+    parser.add_argument('--data-dir', default='.', help="Directory the pipeline wrote its outputs to")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help="Cached query results (LRU)")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args()
+
+    server = make_server(args.data_dir, args.host, args.port, args.cache_size, args.verbose)
+    print(f"Serving {args.data_dir} on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import numpy as np
+import pandas as pd
+from elo_engine import INITIAL_ELO
+from elo_checkpoints import KINDS
+from snapshot import read_table
+
+# Time-indexed ratings: the Elo history is held as one date-sorted array per player, laid
+# end to end. Every row gets the key player_code * span + day, which is sorted across the
+# whole table, so "each player's last rating on or before D" is one searchsorted over all
+# players at once. Rolling form (rating gained over a player's last N matches) is precomputed
+# per row; form over the last N days is measured back from the query date in the same pass.
+FORM_MATCHES = 10
+FORM_DAYS = 365
+
+
+class RatingStore:
+    def __init__(self, history, name_col, rating_col, form_matches=FORM_MATCHES, form_days=FORM_DAYS):
+        self.form_matches = form_matches
+        self.form_days = form_days
+        days = pd.to_datetime(history['date'], errors='coerce').to_numpy().astype('datetime64[D]')
+        dated = ~np.isnat(days)
+        names = history[name_col].to_numpy()[dated]
+        codes, players = pd.factorize(np.asarray(names, dtype=object), sort=True)
+        day_numbers = days[dated].astype(np.int64)
+        # Stable, so same-day matches keep their rating order
+        order = np.lexsort((day_numbers, codes))
+        self.players = np.asarray(players, dtype=object)
+        self.codes = codes[order]
+        self.days = day_numbers[order]
+        self.ratings = history[rating_col].to_numpy(dtype=np.float64)[dated][order]
+
+        n = len(self.codes)
+        first = np.r_[True, self.codes[1:] != self.codes[:-1]] if n else np.zeros(0, dtype=bool)
+        self.starts = np.flatnonzero(first)
+        self.first_day = self.days.min() if n else 0
+        self.span = (self.days.max() - self.first_day + 1) if n else 1
+        self.keys = self.codes * self.span + (self.days - self.first_day)
+
+        # Rating before each match and the row where each player's career starts
+        self.before = np.r_[INITIAL_ELO, self.ratings[:-1]] if n else self.ratings
+        self.before[self.starts] = INITIAL_ELO
+        self.career_start = np.repeat(self.starts, np.diff(np.r_[self.starts, n]))
+        # Form over the last form_matches matches, as of each row
+        window_start = np.maximum(np.arange(n) - form_matches + 1, self.career_start)
+        self.form = self.ratings - self.before[window_start]
+
+    def date_range(self):
+        if len(self.days) == 0:
+            return None
+        return (pd.Timestamp(np.datetime64(int(self.first_day), 'D')),
+                pd.Timestamp(np.datetime64(int(self.days.max()), 'D')))
+
+    def day_keys(self, date):
+        day = np.datetime64(pd.Timestamp(date).date(), 'D').astype(np.int64) - self.first_day
+        return np.arange(len(self.players)) * self.span + np.clip(day, -1, self.span - 1)
+
+    def as_of(self, date):
+        """Ratings of every player who had played by `date` (inclusive), indexed by player.
+
+        Columns: rating, matches (matches rated so far), last_match, form_<N>m (rating
+        gained over their last N matches) and form_<N>d (rating gained in the N days up to
+        `date`, 0 if they did not play in that window).
+        """
+        if len(self.keys) == 0:
+            return self.frame(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0))
+        last = np.searchsorted(self.keys, self.day_keys(date), side='right') - 1
+        played = np.zeros(len(self.players), dtype=bool)
+        valid = last >= 0
+        played[valid] = self.codes[last[valid]] == np.flatnonzero(valid)
+        players = np.flatnonzero(played)
+        rows = last[played]
+        # First row inside the day window; a window with no matches gains nothing
+        window = np.searchsorted(self.keys, self.day_keys(pd.Timestamp(date) - pd.Timedelta(days=self.form_days))[players],
+                                 side='right')
+        window = np.maximum(window, self.career_start[rows])
+        form_days = np.where(window <= rows, self.ratings[rows] - self.before[np.minimum(window, rows)], 0.0)
+        return self.frame(players, rows, form_days)
+
+    def frame(self, players, rows, form_days):
+        table = pd.DataFrame({
+            'rating': self.ratings[rows],
+            'matches': rows - self.career_start[rows] + 1,
+            'last_match': pd.to_datetime(np.asarray(self.days[rows], dtype='datetime64[D]')),
+            f"form_{self.form_matches}m": self.form[rows],
+            f"form_{self.form_days}d": form_days
+        }, index=pd.Index(self.players[players], name='player'))
+        return table
+
+    def player(self, player):
+        # One player's rating and form history, in date order
+        code = np.searchsorted(self.players, player)
+        if code >= len(self.players) or self.players[code] != player:
+            return pd.DataFrame(columns=['date', 'rating', f"form_{self.form_matches}m"])
+        start, end = np.searchsorted(self.codes, [code, code + 1])
+        return pd.DataFrame({
+            'date': pd.to_datetime(np.asarray(self.days[start:end], dtype='datetime64[D]')),
+            'rating': self.ratings[start:end],
+            f"form_{self.form_matches}m": self.form[start:end]
+        })
+
+
+def load_store(kind, data_dir='.', **kwargs):
+    name_col, rating_col, history_file = KINDS[kind]
+    return RatingStore(read_table(data_dir, history_file[:-len('.csv')], indexed=False), name_col, rating_col, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Leaderboard of Elo ratings as of a date.")
+    parser.add_argument('kind', choices=list(KINDS))
+    parser.add_argument('--as-of', required=True, help="Date (YYYY-MM-DD); ratings include matches on that day")
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--sort', default='rating', help="Column to rank by, e.g. form_10m or form_365d")
+    parser.add_argument('--min-matches', type=int, default=0)
+    parser.add_argument('--form-matches', type=int, default=FORM_MATCHES)
+    parser.add_argument('--form-days', type=int, default=FORM_DAYS)
+    args = parser.parse_args()
+
+    store = load_store(args.kind, form_matches=args.form_matches, form_days=args.form_days)
+    table = store.as_of(args.as_of)
+    table = table[table['matches'] >= args.min_matches]
+    print(table.sort_values(args.sort, ascending=False).head(args.top).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from delivery_store import season_of
+
+# Rollup cube: additive totals per (player, league, season, phase), where the phase is the
+# part of the innings a delivery was bowled in. Every measure is a plain sum, so any slice
+# (one league, a range of seasons, death overs only, ...) is answered by filtering the cube
+# and summing again; nothing has to be re-ingested. A full career is the sum over all keys.
+CUBE = 'rollup_cube.parquet'
+KEYS = ['player', 'league', 'season', 'phase']
+PHASES = ['powerplay', 'middle', 'death']
+PHASE_STARTS = [6, 15]  # first (0-based) over of the middle and death phases
+BAT_MEASURES = {'runs': 'runs', 'balls': 'balls_faced'}
+BOWL_MEASURES = {'wickets': 'wickets', 'balls': 'balls_bowled', 'runs_conceded': 'runs_conceded'}
+FIELDING_MEASURES = ['catch', 'run_out', 'stumping']
+MEASURES = list(BAT_MEASURES.values()) + list(BOWL_MEASURES.values()) + FIELDING_MEASURES
+
+
+def phase_codes(overs):
+    # 0 powerplay (overs 0-5), 1 middle (6-14), 2 death (15 on)
+    return np.searchsorted(PHASE_STARTS, np.asarray(overs), side='right').astype(np.int8)
+
+
+def key_columns(player, league, date, over):
+    # Cube keys for row-aligned delivery columns; dates are reduced to seasons once per distinct date
+    date_codes, dates = pd.factorize(pd.Series(date, dtype=object), use_na_sentinel=False)
+    seasons = np.asarray([season_of(d) for d in dates], dtype=object)
+    return pd.DataFrame({
+        'player': np.asarray(player, dtype=object),
+        'league': np.asarray(league, dtype=object),
+        'season': seasons[date_codes],
+        'phase': phase_codes(over)
+    })
+
+
+def cube_part(table, measures):
+    """Partial cube of one delivery table (a DataFrame or ingest's decoded columns).
+
+    measures maps the table's columns to cube measures, e.g. {'balls': 'balls_faced'}.
+    """
+    frame = key_columns(table['player'], table['league'], table['date'], table['over'])
+    for column, measure in measures.items():
+        frame[measure] = np.asarray(table[column], dtype=np.int64)
+    return frame.groupby(KEYS, sort=False).sum().reset_index()
+
+
+def fielding_part(table):
+    # Partial cube of fielding events: one count column per event
+    frame = key_columns(table['player'], table['league'], table['date'], table['over'])
+    frame['event'] = np.asarray(table['event'], dtype=object)
+    counts = frame.groupby(KEYS + ['event'], sort=False).size().unstack(fill_value=0)
+    return counts.reindex(columns=FIELDING_MEASURES, fill_value=0).reset_index()
+
+
+def merge_parts(parts):
+    """Sums partial cubes (any measures, keys repeated across parts) into the cube frame."""
+    parts = [part for part in parts if len(part)]
+    if not parts:
+        return empty_cube()
+    merged = pd.concat(parts, ignore_index=True)
+    merged = merged.reindex(columns=KEYS + MEASURES).fillna({name: 0 for name in MEASURES})
+    cube = merged.groupby(KEYS).sum().reset_index()
+    for name in MEASURES:
+        cube[name] = cube[name].astype(np.int32)
+    return categorize(cube)
+
+
+def categorize(cube):
+    cube['player'] = cube['player'].astype('category')
+    cube['league'] = cube['league'].astype('category')
+    cube['season'] = cube['season'].astype('category')
+    cube['phase'] = pd.Categorical.from_codes(cube['phase'].to_numpy().astype(np.int8), PHASES)
+    return cube
+
+
+def empty_cube():
+    cube = pd.DataFrame({name: pd.Series(dtype=object) for name in KEYS[:3]})
+    cube['phase'] = np.zeros(0, dtype=np.int8)
+    for name in MEASURES:
+        cube[name] = np.zeros(0, dtype=np.int32)
+    return categorize(cube)
+
+
+def cube_parts(bat_df, bowl_df, fielding_df):
+    # Partial cubes of the pipeline's delivery tables (before aggregation rewrites their dates)
+    parts = []
+    if not bat_df.empty:
+        parts.append(cube_part(bat_df, BAT_MEASURES))
+    if not bowl_df.empty:
+        parts.append(cube_part(bowl_df, BOWL_MEASURES))
+    if not fielding_df.empty:
+        parts.append(fielding_part(fielding_df))
+    return parts
+
+
+def build_cube(bat_df, bowl_df, fielding_df):
+    return RollupCube(merge_parts(cube_parts(bat_df, bowl_df, fielding_df)))
+
+
+class RollupCube:
+    def __init__(self, cube):
+        self.cube = cube
+        # Category codes per key column, so filters compare small integers instead of strings
+        self.codes = {name: cube[name].cat.codes.to_numpy() for name in KEYS}
+
+    def __len__(self):
+        return len(self.cube)
+
+    def options(self, key):
+        # Values a filter on `key` can take, in display order
+        return list(self.cube[key].cat.categories)
+
+    def mask(self, **filters):
+        # Rows matching every given filter; a filter is a list of allowed values (None / empty: all)
+        keep = np.ones(len(self.cube), dtype=bool)
+        for key, values in filters.items():
+            if values:
+                allowed = self.cube[key].cat.categories.get_indexer(list(values))
+                keep &= np.isin(self.codes[key], allowed[allowed >= 0])
+        return keep
+
+    def query(self, by=('player',), players=None, leagues=None, seasons=None, phases=None):
+        """Measures summed over the slice, grouped by the `by` keys, plus derived rates.
+
+        strike_rate is runs per 100 balls faced, economy runs conceded per over and
+        bowling_average runs conceded per wicket (NaN where the denominator is 0).
+        """
+        rows = self.cube[self.mask(player=players, league=leagues, season=seasons, phase=phases)]
+        table = rows.groupby(list(by), observed=True)[MEASURES].sum()
+        table['strike_rate'] = table['runs'] / table['balls_faced'].replace(0, np.nan) * 100
+        table['economy'] = table['runs_conceded'] / table['balls_bowled'].replace(0, np.nan) * 6
+        table['bowling_average'] = table['runs_conceded'] / table['wickets'].replace(0, np.nan)
+        table['fielding'] = table[FIELDING_MEASURES].sum(axis=1)
+        return table
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        self.cube.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        cube = pd.read_parquet(path)
+        for name in KEYS:
+            if not isinstance(cube[name].dtype, pd.CategoricalDtype):
+                cube[name] = cube[name].astype('category')
+        cube['phase'] = cube['phase'].cat.set_categories(PHASES)
+        return cls(cube)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-aggregate a slice of the rollup cube.")
+    parser.add_argument('--cube', default=CUBE)
+    parser.add_argument('--by', nargs='+', default=['player'], choices=KEYS)
+    parser.add_argument('--player', nargs='+', help="Player keys: Cricsheet ids (see player_registry.py), or names of unregistered players")
+    parser.add_argument('--league', nargs='+')
+    parser.add_argument('--season', nargs='+')
+    parser.add_argument('--phase', nargs='+', choices=PHASES)
+    parser.add_argument('--sort', default='runs')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    cube = RollupCube.load(args.cube)
+    table = cube.query(by=args.by, players=args.player, leagues=args.league, seasons=args.season,
+                       phases=args.phase)
+    print(table.sort_values(args.sort, ascending=False).head(args.top).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from streaming import peak_rss_mb
+
+# Per-stage instrumentation for pipeline runs. Every stage records wall time, CPU time (this
+# process and finished worker processes), memory and the rows and files it handled; the run
+# is written as a JSON report. Stages can opt in to a cProfile dump and to tracemalloc (peak
+# Python allocation plus the top allocation sites).
+#
+# Memory per stage (this process only, not pool workers): peak_rss_mb is the stage's own peak
+# RSS, measured by resetting the kernel's high-water mark when the stage starts (Linux;
+# absent elsewhere); max_rss_mb is the process's running maximum up to the end of the stage
+# and peak_rss_delta_mb how much the stage raised it.
+REPORT = 'run_report.json'
+PROFILE_DIR = 'profiles'
+TOP_ALLOCATIONS = 5
+CLEAR_REFS = '/proc/self/clear_refs'
+PROC_STATUS = '/proc/self/status'
+
+
+def rss_mb(value):
+    return round(value, 1) if value is not None else None
+
+
+def high_water_mb():
+    # Peak RSS since process start or the last reset_high_water (VmHWM on Linux, which also
+    # backs ru_maxrss); the getrusage peak elsewhere
+    try:
+        with open(PROC_STATUS) as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def reset_high_water():
+    # Restarts the high-water mark from the current RSS (Linux 4.0+); False where unsupported
+    try:
+        with open(CLEAR_REFS, 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.files = None
+        self.record = {'stage': name}
+        self.inner_peak = 0.0  # peaks of stages nested in this one, which reset the high-water mark
+
+
+class RunReport:
+    def __init__(self, profile=(), trace_memory=(), profile_dir=PROFILE_DIR):
+        # profile / trace_memory: stage names to instrument, or ['all']
+        self.profile = set(profile)
+        self.trace_memory = set(trace_memory)
+        self.profile_dir = profile_dir
+        self.started = datetime.now(timezone.utc)
+        self.stages = []
+        self.active = []  # stages currently running, outermost first
+        self.max_rss = 0.0  # running peak RSS, kept here because the per-stage resets clear the kernel's
+
+    def wants(self, hooks, name):
+        return 'all' in hooks or name in hooks
+
+    @contextmanager
+    def stage(self, name):
+        stage = Stage(name)
+        self.stages.append(stage.record)
+        profiler = cProfile.Profile() if self.wants(self.profile, name) else None
+        tracing = self.wants(self.trace_memory, name) and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        start_peak = high_water_mb()
+        if start_peak is not None:
+            self.observe(start_peak)
+        max_before = self.max_rss
+        reset = start_peak is not None and reset_high_water()
+        self.active.append(stage)
+        times = os.times()
+        wall = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield stage
+        except BaseException as exc:
+            stage.record['error'] = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            end = os.times()
+            stage.record['wall_seconds'] = round(time.perf_counter() - wall, 4)
+            stage.record['cpu_seconds'] = round(max(end.user + end.system - times.user - times.system, 0), 4)
+            children = round(end.children_user + end.children_system - times.children_user - times.children_system, 4)
+            if children > 0:
+                stage.record['worker_cpu_seconds'] = children
+            self.active.pop()
+            end_peak = high_water_mb()
+            if end_peak is not None:
+                if reset:
+                    stage.record['peak_rss_mb'] = rss_mb(max(end_peak, stage.inner_peak))
+                self.observe(max(end_peak, stage.inner_peak))
+                stage.record['max_rss_mb'] = rss_mb(self.max_rss)
+                stage.record['peak_rss_delta_mb'] = rss_mb(self.max_rss - max_before)
+            if stage.rows is not None:
+                stage.record['rows'] = int(stage.rows)
+            if stage.files is not None:
+                stage.record['files'] = int(stage.files)
+            if tracing:
+                stage.record['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+                top = tracemalloc.take_snapshot().statistics('lineno')[:TOP_ALLOCATIONS]
+                stage.record['top_allocations'] = [
+                    {'site': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                     'mb': round(stat.size / 2**20, 2)} for stat in top]
+                tracemalloc.stop()
+            if profiler is not None:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                path = os.path.join(self.profile_dir, f"{name}.prof")
+                profiler.dump_stats(path)
+                stage.record['profile'] = path
+
+    def observe(self, peak):
+        # A high-water reading: counts towards the running peak and every enclosing stage's peak
+        self.max_rss = max(self.max_rss, peak)
+        for stage in self.active:
+            stage.inner_peak = max(stage.inner_peak, peak)
+
+    def peak_rss(self):
+        # Peak RSS of the whole run so far
+        now = high_water_mb()
+        peak = max(self.max_rss, now) if now is not None else self.max_rss
+        return rss_mb(peak) if peak else None
+
+    def summary(self):
+        return {
+            'started': self.started.isoformat(timespec='seconds'),
+            'argv': sys.argv,
+            'python': sys.version.split()[0],
+            'wall_seconds': round(sum(s.get('wall_seconds', 0) for s in self.stages), 4),
+            'cpu_seconds': round(sum(s.get('cpu_seconds', 0) + s.get('worker_cpu_seconds', 0)
+                                     for s in self.stages), 4),
+            'peak_rss_mb': self.peak_rss(),
+            'stages': self.stages
+        }
+
+    def write(self, path=REPORT):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def table(self):
+        # Human-readable one line per stage
+        # peak MB: the stage's own peak RSS; max MB: the process's running peak
+        lines = [f"{'stage':<24}{'wall s':>9}{'cpu s':>9}{'peak MB':>9}{'max MB':>9}{'traced MB':>10}"
+                 f"{'rows':>11}{'files':>8}"]
+        for s in self.stages:
+            peak, top, traced = s.get('peak_rss_mb'), s.get('max_rss_mb'), s.get('traced_peak_mb')
+            lines.append(f"{s['stage']:<24}{s.get('wall_seconds', 0):>9.3f}{s.get('cpu_seconds', 0):>9.3f}"
+                         f"{peak if peak is not None else '-':>9}{top if top is not None else '-':>9}"
+                         f"{traced if traced is not None else '-':>10}{s.get('rows', ''):>11}{s.get('files', ''):>8}")
+        return "\n".join(lines)
@@ -0,0 +1,175 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+import pandas as pd
+from ingest import (parse_batch, make_batches, compact_columns, concat_columns, BAT_COLUMNS, BOWL_COLUMNS,
+                    FIELDING_COLUMNS, PEOPLE_COLUMNS, INT_COLUMNS)
+from run_report import high_water_mb, reset_high_water, rss_mb
+
+# Sharded execution of per-player stages. Rows are hash-partitioned on the player key
+# (ingest.py; people rows on their Cricsheet id, which is the key of a registered player), so
+# all of a player's deliveries, match aggregates and Elo history land in the same shard,
+# and each shard is processed in its own worker process. Nothing computed per player
+# depends on other players, so the shards' outputs put back into serial row order are
+# exactly the serial outputs; anything over all players (e.g. the elite quantiles) is
+# computed afterwards on the merged tables.
+#
+# Delivery rows are partitioned as they are parsed: each parse batch comes back as one set
+# of compact tables (ingest.compact_columns: int codes plus the batch's vocabulary) per
+# shard, and the parent only collects them, never building the full delivery frames. Bat
+# rows carry their delivery's bowler, so batter-vs-bowler pairs are summed in the batter's
+# shard. The matchup index, rollup cube and registry are additive, so each shard builds its
+# partial of them (as streaming.py does per chunk) and the parent sums those.
+# Each shard's CPU time and peak RSS are recorded in the run report; benchmark.py models the
+# critical path of a one-core-per-shard run from them (an estimate, not a measured run).
+SHARD_BAT_COLUMNS = BAT_COLUMNS + ['bowler']
+SHARD_COLUMNS = [SHARD_BAT_COLUMNS, BOWL_COLUMNS, FIELDING_COLUMNS, PEOPLE_COLUMNS]
+
+
+def name_shards(names, shards):
+    # Shard of each distinct name: pandas' fixed-key hash, the same in every process and run
+    hashes = pd.util.hash_array(np.asarray(names, dtype=object))
+    return (hashes % np.uint64(shards)).astype(np.int64)
+
+
+def player_shards(players, shards):
+    # Shard per row; each distinct name is hashed once
+    codes, uniques = pd.factorize(players)
+    return name_shards(uniques, shards)[codes]
+
+
+def shard_bounds(shard, shards):
+    # Stable row order grouping rows by shard, and each shard's slice of it
+    order = np.argsort(shard, kind='stable')
+    return order, np.searchsorted(shard[order], np.arange(shards + 1))
+
+
+def split_table(table, shards, key='player'):
+    """Rows of `table` per shard, in their original relative order; key=None shards on the
+    index (tables already keyed by player)."""
+    if table.empty:
+        return [table] * shards
+    shard = player_shards(table.index if key is None else table[key], shards)
+    order, bounds = shard_bounds(shard, shards)
+    return [table.iloc[order[lo:hi]] for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def take_rows(table, rows):
+    # Rows of a compact table; string columns keep only the vocabulary those rows use, so
+    # every shard does not pickle the whole batch's names
+    part = {}
+    for name, column in table.items():
+        if isinstance(column, tuple):
+            codes, uniques = column[0][rows], column[1]
+            used = np.flatnonzero(np.bincount(codes, minlength=len(uniques)))
+            remap = np.zeros(len(uniques), dtype=np.int32)
+            remap[used] = np.arange(len(used), dtype=np.int32)
+            part[name] = (remap[codes], uniques[used])
+        else:
+            part[name] = column[rows]
+    return part
+
+
+def split_compact(table, shards, key='player'):
+    # Rows of a compact table per shard, by its `key` column, in their original order
+    codes, names = table[key]
+    order, bounds = shard_bounds(name_shards(names, shards)[codes], shards)
+    return [take_rows(table, order[lo:hi]) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def split_deliveries(bat, bowl, fielding, people, shards):
+    # Compact (bat, bowl, fielding, people) tables -> one such tuple per shard
+    bat = dict(bat, bowler=bowl['player'])
+    tables = [split_compact(table, shards) for table in (bat, bowl, fielding)]
+    return list(zip(*tables, split_compact(people, shards, 'player_id')))
+
+
+def parse_shards(batch, shards):
+    # Parse worker entry point: one batch's compact tables, already partitioned by shard
+    return split_deliveries(*parse_batch(batch), shards)
+
+
+def parse_sharded(files, shards, workers=1, batch_size=64):
+    """Parses the match files into per-shard compact delivery tables: for each shard, the
+    list of its (bat, bowl, fielding, people) parts, one per batch in file order."""
+    batches = make_batches(files, batch_size)
+    if workers > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(partial(parse_shards, shards=shards), batches))
+    else:
+        results = [parse_shards(batch, shards) for batch in batches]
+    return [list(parts) for parts in zip(*results)] if results else [[] for _ in range(shards)]
+
+
+def split_frames(bat_df, bowl_df, fielding_df, people_df, shards):
+    # Delivery frames already in memory (e.g. from the delivery store) as per-shard parts
+    def compact(frame, columns):
+        return compact_columns({name: frame[name].to_numpy() if name in frame else [] for name in columns})
+    tables = [compact(frame, columns) for frame, columns in
+              zip((bat_df, bowl_df, fielding_df, people_df), [BAT_COLUMNS, BOWL_COLUMNS, FIELDING_COLUMNS, PEOPLE_COLUMNS])]
+    return [[parts] for parts in split_deliveries(*tables, shards)]
+
+
+def delivery_frames(parts):
+    """One shard's parts decoded into (bat_df, bowl_df, fielding_df, people_df); bat_df has a
+    'bowler' column. Tables without rows still get their columns."""
+    frames = []
+    for i, columns in enumerate(SHARD_COLUMNS):
+        frame = concat_columns([part[i] for part in parts], columns)
+        if frame.empty:
+            frame = pd.DataFrame({name: np.zeros(0, dtype=np.int64 if name in INT_COLUMNS else object)
+                                  for name in columns})
+        frames.append(frame)
+    return tuple(frames)
+
+
+def measured(func, *args, **kwargs):
+    # Runs one shard in a worker; returns its result and the worker's CPU seconds and peak RSS
+    # for it (CPU rather than wall time: shards sharing a core would inflate their wall times;
+    # a forked worker's RSS includes pages still shared with the parent)
+    reset = reset_high_water()
+    times = os.times()
+    result = func(*args, **kwargs)
+    end = os.times()
+    stats = {'cpu_seconds': round(end.user + end.system - times.user - times.system, 4),
+             'peak_rss_mb': rss_mb(high_water_mb()) if reset else None}
+    return result, stats
+
+
+def map_shards(func, shard_args, **kwargs):
+    """func(*args, **kwargs) for every shard's args, each in its own process. Returns the
+    results in shard order and each shard's measured() stats."""
+    with ProcessPoolExecutor(max_workers=len(shard_args)) as pool:
+        futures = [pool.submit(measured, func, *args, **kwargs) for args in shard_args]
+        done = [future.result() for future in futures]
+    return [result for result, _ in done], [stats for _, stats in done]
+
+
+def run_sharded(func, tables, shards, keys=None, **kwargs):
+    """Splits each table by player and calls func(*shard_tables, **kwargs) for every shard in
+    its own process; returns the results in shard order and the shards' stats (map_shards).
+    keys gives each table's player column (None: its index), 'player' by default."""
+    keys = keys or ['player'] * len(tables)
+    parts = [split_table(table, shards, key) for table, key in zip(tables, keys)]
+    return map_shards(func, list(zip(*parts)), **kwargs)
+
+
+def merge_frames(frames, order_by=None):
+    """Shard outputs as one table in serial order: sorted by index for tables keyed by player,
+    or stably by the order_by column (per-player row order within a shard is kept)."""
+    parts = [frame for frame in frames if len(frame)] or frames[:1]
+    merged = pd.concat(parts) if len(parts) > 1 else parts[0]
+    if order_by is None:
+        return merged.sort_index()
+    return merged.sort_values(order_by, kind='stable').reset_index(drop=True)
+
+
+def merge_counts(frames):
+    # Player x category count tables whose columns differ by shard (a shard without a
+    # stumping has no stumping column): missing counts are 0, columns in sorted order
+    parts = [frame for frame in frames if not frame.empty]
+    if not parts:
+        return pd.DataFrame()
+    merged = pd.concat(parts).fillna(0).astype(np.int64)
+    return merged.sort_index().sort_index(axis=1)
@@ -0,0 +1,76 @@
+import io
+import os
+import pandas as pd
+
+# Binary (Feather/Arrow) copies of the pipeline outputs. Columns keep their types (dates stay
+# timestamps), so the dashboard skips CSV parsing; the CSVs remain the fallback.
+SNAPSHOT_DIR = 'snapshot'
+# Download formats for output tables: label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'CSV (gzip)': ('csv.gz', 'application/gzip'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet')
+}
+
+
+def write_snapshot(frames, out_dir=SNAPSHOT_DIR):
+    # frames: {name: DataFrame}; a named index (e.g. 'player') is stored as the first column
+    os.makedirs(out_dir, exist_ok=True)
+    for name, frame in frames.items():
+        table = frame.reset_index() if frame.index.name is not None else frame.reset_index(drop=True)
+        table = table.rename_axis(columns=None)
+        path = os.path.join(out_dir, f"{name}.feather")
+        tmp_path = path + '.tmp'
+        table.to_feather(tmp_path)
+        os.replace(tmp_path, path)
+
+
+def snapshot_path(data_dir, name):
+    # Snapshot file for an output table, or None if it is missing or older than the CSV
+    path = os.path.join(data_dir, SNAPSHOT_DIR, f"{name}.feather")
+    csv_path = os.path.join(data_dir, f"{name}.csv")
+    if not os.path.exists(path):
+        return None
+    if os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(path):
+        return None
+    return path
+
+
+def read_table(data_dir, name, indexed=True):
+    """Reads one pipeline output, preferring the Feather snapshot over the CSV.
+
+    Indexed tables come back indexed by their first column, like read_csv(index_col=0).
+    Raises FileNotFoundError when neither file exists.
+    """
+    path = snapshot_path(data_dir, name)
+    if path is not None:
+        try:
+            table = pd.read_feather(path)
+        except ImportError:  # pyarrow not installed
+            table = None
+        if table is not None:
+            return table.set_index(table.columns[0]) if indexed and len(table.columns) else table
+    csv_path = os.path.join(data_dir, f"{name}.csv")
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(csv_path)
+    if indexed:
+        return pd.read_csv(csv_path, index_col=0)
+    table = pd.read_csv(csv_path)
+    if 'date' in table.columns:
+        table['date'] = pd.to_datetime(table['date'], errors='coerce')
+    return table
+
+
+def export_bytes(frame, fmt):
+    # One output table serialized in an EXPORT_FORMATS format; the index is kept as a column
+    if fmt == 'CSV':
+        return frame.to_csv().encode('utf-8')
+    buffer = io.BytesIO()
+    if fmt == 'CSV (gzip)':
+        # mtime 0 keeps the bytes identical for identical tables
+        frame.to_csv(buffer, compression={'method': 'gzip', 'mtime': 0})
+    elif fmt == 'Parquet':
+        frame.to_parquet(buffer)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return buffer.getvalue()
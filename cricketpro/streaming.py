@@ -0,0 +1,232 @@
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+from ingest import parse_batch, make_batches, match_dates
+from matchups import MatchupIndex, sum_pairs
+from rollup import BAT_MEASURES, BOWL_MEASURES, cube_part, fielding_part, merge_parts, RollupCube
+from player_registry import registry_part, merge_registry, PlayerRegistry
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Bounded-memory aggregation: match files are parsed a chunk at a time, every string column
+# is mapped to integer codes in a run-wide vocabulary, and each chunk is reduced to
+# per-(player, match) partial aggregates before the next chunk is read. Only the partials
+# (one row per player per match) are kept, never the delivery rows.
+
+
+class Vocab:
+    # Run-wide string -> int code mapping shared by all chunks
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, column):
+        # column is a (codes, uniques) pair from ingest.compact_columns
+        codes, uniques = column
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.values)
+                self.values.append(value)
+            mapping[i] = code
+        return mapping[codes]
+
+    def decode(self, codes):
+        return np.asarray(self.values, dtype=object)[codes]
+
+
+class MatchIds:
+    # Integer match ids for the (date label, league, team) keys the serial path joins into strings
+    def __init__(self):
+        self.ids = {}
+        self.keys = []
+
+    def encode(self, date_codes, league_codes, team_codes, dates, leagues, teams):
+        triples = np.stack([date_codes, league_codes, team_codes], axis=1)
+        uniques, inverse = np.unique(triples, axis=0, return_inverse=True)
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        for i, (d, l, t) in enumerate(uniques):
+            # Keyed on the parsed date's label, as in the serial string ids: two unparseable
+            # date strings are both NaT there, so they must share a match id here too
+            key = (dates[d], l, t)
+            match_id = self.ids.get(key)
+            if match_id is None:
+                match_id = self.ids[key] = len(self.keys)
+                self.keys.append(f"{dates[d]}_{leagues[l]}_{teams[t]}")
+            mapping[i] = match_id
+        return mapping[inverse.ravel()]
+
+    def ranks(self):
+        # Renumbers ids so they sort like the serial path's string match ids
+        order = np.argsort(np.asarray(self.keys, dtype=object), kind='stable')
+        ranks = np.empty(len(order), dtype=np.int32)
+        ranks[order] = np.arange(len(order), dtype=np.int32)
+        return ranks
+
+
+class StreamState:
+    def __init__(self, matchups=False, cube=False, registry=False):
+        self.players = Vocab()
+        self.teams = Vocab()
+        self.leagues = Vocab()
+        self.match_types = Vocab()
+        self.events = Vocab()
+        self.dates = Vocab()
+        self.date_values = []  # datetime64[ns] as int64 per date code, NaT included
+        self.date_labels = []  # str(date) as the serial path prints it into match ids
+        self.match_ids = MatchIds()
+        self.bat_parts = []
+        self.bowl_parts = []
+        self.fielding_parts = []
+        self.matchup_parts = [] if matchups else None
+        self.cube_parts = [] if cube else None
+        self.registry_parts = [] if registry else None
+
+    def encode_dates(self, column):
+        codes = self.dates.encode(column)
+        new = self.dates.values[len(self.date_values):]
+        if new:
+            parsed = pd.to_datetime(pd.Series(new, dtype=object), errors='coerce').astype('datetime64[ns]')
+            self.date_values.extend(parsed.to_numpy().view(np.int64).tolist())
+            self.date_labels.extend(match_dates(parsed).tolist())
+        return codes
+
+    def chunk_frame(self, table, measures):
+        date_codes = self.encode_dates(table['date'])
+        league_codes = self.leagues.encode(table['league'])
+        team_codes = self.teams.encode(table['team'])
+        frame = pd.DataFrame({
+            'player': self.players.encode(table['player']),
+            'match_id': self.match_ids.encode(date_codes, league_codes, team_codes,
+                                              self.date_labels, self.leagues.values, self.teams.values),
+            'league': league_codes.astype(np.int16),
+            'match_type': self.match_types.encode(table['match_type']).astype(np.int16),
+            'date': np.asarray(self.date_values, dtype=np.int64)[date_codes]
+        })
+        for name in measures:
+            frame[name] = table[name].astype(np.int32)
+        return frame
+
+    def add_chunk(self, bat, bowl, fielding, people):
+        self.bat_parts.append(partial_aggregate(self.chunk_frame(bat, ['runs', 'balls']), ['runs', 'balls']))
+        bowl_measures = ['wickets', 'balls', 'runs_conceded']
+        self.bowl_parts.append(partial_aggregate(self.chunk_frame(bowl, bowl_measures), bowl_measures))
+        if self.matchup_parts is not None:
+            # Per-(batter, bowler) partial totals; bat and bowl rows are the same deliveries
+            values = np.stack([bat['runs'], bat['balls'], bat['dismissal']])
+            self.matchup_parts.append(sum_pairs(self.players.encode(bat['player']),
+                                                self.players.encode(bowl['player']), values))
+        if self.cube_parts is not None:
+            # Per-(player, league, season, phase) partial totals (rollup.py)
+            self.cube_parts.append(cube_part(decoded(bat), BAT_MEASURES))
+            self.cube_parts.append(cube_part(decoded(bowl), BOWL_MEASURES))
+            if len(fielding['event'][0]):
+                self.cube_parts.append(fielding_part(decoded(fielding)))
+        if self.registry_parts is not None and len(people['player'][0]):
+            self.registry_parts.append(registry_part(decoded(people)))
+        if len(fielding['event'][0]):
+            counts = pd.DataFrame({
+                'player': self.players.encode(fielding['player']),
+                'event': self.events.encode(fielding['event'])
+            }).groupby(['player', 'event']).size()
+            self.fielding_parts.append(counts)
+
+    def finish(self, parts, measures):
+        # Merges the partial aggregates into the serial path's agg frame
+        if not parts:
+            return pd.DataFrame()
+        merged = partial_aggregate(pd.concat(parts, ignore_index=True), measures)
+        merged['match_id'] = self.match_ids.ranks()[merged['match_id'].to_numpy()]
+        agg = pd.DataFrame({
+            'player': self.players.decode(merged['player'].to_numpy()),
+            'match_id': merged['match_id'].to_numpy()
+        })
+        for name in measures:
+            agg[name] = merged[name].to_numpy().astype(np.int64)
+        agg['league'] = pd.Categorical.from_codes(merged['league'].to_numpy(), self.leagues.values)
+        agg['match_type'] = pd.Categorical.from_codes(merged['match_type'].to_numpy(), self.match_types.values)
+        agg['date'] = merged['date'].to_numpy().view('datetime64[ns]')
+        return agg.sort_values(['player', 'match_id'], kind='stable').reset_index(drop=True)
+
+    def matchups(self):
+        parts = self.matchup_parts
+        if not parts:
+            return MatchupIndex.from_deliveries([], [], [], [])
+        return MatchupIndex.from_pairs(self.players.values, np.concatenate([p[0] for p in parts]),
+                                       np.concatenate([p[1] for p in parts]), np.hstack([p[2] for p in parts]))
+
+    def fielding_counts(self):
+        if not self.fielding_parts:
+            return pd.DataFrame()
+        counts = pd.concat(self.fielding_parts).groupby(level=['player', 'event']).sum()
+        table = counts.unstack(fill_value=0)
+        table.index = pd.Index(self.players.decode(table.index.to_numpy()), name='player')
+        table.columns = pd.Index(self.events.decode(table.columns.to_numpy()), name='event')
+        return table.sort_index().sort_index(axis=1)
+
+
+def decoded(table):
+    # Compact chunk columns back to plain arrays
+    return {name: column[1][column[0]] if isinstance(column, tuple) else column for name, column in table.items()}
+
+
+def partial_aggregate(frame, measures):
+    # Sums measures and keeps the first league/match_type/date per (player, match_id)
+    spec = {name: (name, 'sum') for name in measures}
+    spec.update(league=('league', 'first'), match_type=('match_type', 'first'), date=('date', 'first'))
+    return frame.groupby(['player', 'match_id'], sort=False).agg(**spec).reset_index()
+
+
+def iter_chunks(batches, workers):
+    # Parsed chunks in file order; at most 2 * workers chunks are in flight at once
+    if workers <= 1:
+        for batch in batches:
+            yield parse_batch(batch)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.submit(parse_batch, batch))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def stream_aggregates(files, workers=1, chunk_files=200, matchup_path=None, cube_path=None, registry_path=None):
+    """Aggregates match files chunk by chunk; returns (agg_bat, agg_bowl, fielding_counts).
+
+    agg_bat / agg_bowl match the serial groupby output except that match_id is an integer
+    (ordered like the string ids) and league / match_type are categorical. With matchup_path
+    the batter-vs-bowler index (matchups.py) is built in the same pass and saved there,
+    and likewise the rollup cube (rollup.py) with cube_path and the player registry
+    (player_registry.py) with registry_path.
+    """
+    state = StreamState(matchups=matchup_path is not None, cube=cube_path is not None,
+                        registry=registry_path is not None)
+    for chunk in iter_chunks(make_batches(files, chunk_files), workers):
+        state.add_chunk(*chunk)
+    agg_bat = state.finish(state.bat_parts, ['runs', 'balls'])
+    agg_bowl = state.finish(state.bowl_parts, ['wickets', 'balls', 'runs_conceded'])
+    if matchup_path is not None:
+        state.matchups().save(matchup_path)
+    if cube_path is not None:
+        RollupCube(merge_parts(state.cube_parts)).save(cube_path)
+    if registry_path is not None:
+        PlayerRegistry(merge_registry(state.registry_parts, state.players.values)).save(registry_path)
+    return agg_bat, agg_bowl, state.fielding_counts()
+
+
+def peak_rss_mb():
+    # Peak resident set size of this process in MB, or None where unsupported
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
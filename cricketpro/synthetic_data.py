@@ -0,0 +1,149 @@
+import os
+import json
+import argparse
+import numpy as np
+
+# Synthetic Cricsheet-format T20 matches for benchmarks. Every season each league redraws its
+# franchise squads from its own slice of the player pool, and neighbouring slices overlap, so
+# players build careers across seasons and leagues much like the real corpus. Output is deterministic for a given seed.
+# Scale 1 is roughly the size of today's corpus (300k+ deliveries across 8 leagues).
+BASE_MATCHES = 1500
+BASE_PLAYERS = 3000
+LEAGUES = ['IPL', 'BBL', 'PSL', 'CPL', 'T20WC', 'SMAT', 'SAT', 'T20I']
+FIRST_SEASON = 2008
+SEASONS = 17
+TEAMS_PER_LEAGUE = 8
+SQUAD_SIZE = 16
+
+RUN_VALUES = np.array([0, 1, 2, 3, 4, 6])
+RUN_WEIGHTS = np.array([0.38, 0.36, 0.08, 0.01, 0.12, 0.05])
+WICKET_KINDS = ['caught', 'caught', 'caught', 'bowled', 'lbw', 'run out', 'stumped']
+WICKET_RATE = 0.05
+EXTRA_RATE = 0.04
+
+
+def league_labels(leagues):
+    # The real league labels first, then L9, L10, ... for larger benchmarks
+    return [LEAGUES[i] if i < len(LEAGUES) else f"L{i + 1}" for i in range(leagues)]
+
+
+def league_squads(rng, n_players, n_leagues):
+    # Each league draws its squads from a pool slice overlapping its neighbours by about a third
+    pool = min(max(n_players // n_leagues * 3 // 2, TEAMS_PER_LEAGUE * SQUAD_SIZE), n_players)
+    squads = []
+    for i in range(n_leagues):
+        start = i * n_players // n_leagues
+        members = (start + rng.choice(pool, TEAMS_PER_LEAGUE * SQUAD_SIZE, replace=False)) % n_players
+        squads.append(members.reshape(TEAMS_PER_LEAGUE, SQUAD_SIZE))
+    return squads
+
+
+def innings_overs(rng, batters, bowlers, names):
+    # 20 overs of ball-by-ball data for one innings: batters in order, five bowlers rotating
+    n = 120
+    runs = rng.choice(RUN_VALUES, n, p=RUN_WEIGHTS)
+    extras = (rng.random(n) < EXTRA_RATE).astype(int)
+    out = rng.random(n) < WICKET_RATE
+    kinds = rng.integers(len(WICKET_KINDS), size=n)
+    fielders = rng.integers(len(bowlers), size=n)
+    striker, non_striker, next_in = 0, 1, 2
+    overs = []
+    for over in range(20):
+        bowler = names[bowlers[over % 5]]
+        deliveries = []
+        for ball in range(over * 6, over * 6 + 6):
+            delivery = {
+                'batter': names[batters[striker]],
+                'bowler': bowler,
+                'non_striker': names[batters[non_striker]],
+                'runs': {'batter': int(runs[ball]), 'extras': int(extras[ball]),
+                         'total': int(runs[ball] + extras[ball])}
+            }
+            if extras[ball]:
+                delivery['extras'] = {'legbyes': 1}
+            if out[ball] and next_in < 11:
+                kind = WICKET_KINDS[kinds[ball]]
+                wicket = {'player_out': names[batters[striker]], 'kind': kind}
+                if kind in ('caught', 'run out', 'stumped'):
+                    wicket['fielders'] = [{'name': names[bowlers[fielders[ball]]]}]
+                delivery['wickets'] = [wicket]
+                striker, next_in = next_in, next_in + 1
+            elif runs[ball] % 2:
+                striker, non_striker = non_striker, striker
+            deliveries.append(delivery)
+        striker, non_striker = non_striker, striker
+        overs.append({'over': over, 'deliveries': deliveries})
+    return overs
+
+
+def generate_corpus(root, matches=BASE_MATCHES, players=BASE_PLAYERS, leagues=len(LEAGUES), seed=0):
+    """Writes `matches` synthetic match files split across `leagues` league folders under `root`.
+
+    Returns the league folders as [(folder, label)], ready for the pipeline's league_folders.
+    """
+    if players < TEAMS_PER_LEAGUE * SQUAD_SIZE:
+        raise ValueError(f"Need at least {TEAMS_PER_LEAGUE * SQUAD_SIZE} players for full league squads")
+    rng = np.random.default_rng(seed)
+    names = [f"Player {i:06d}" for i in range(players)]
+    ids = [f"{i:08x}" for i in range(players)]
+    labels = league_labels(leagues)
+    squads = [league_squads(rng, players, leagues) for _ in range(SEASONS)]
+    folders = []
+    match_id = 1000000
+    for li, label in enumerate(labels):
+        folder = os.path.join(root, f"{label.lower()}_male_json")
+        os.makedirs(folder, exist_ok=True)
+        folders.append((folder, label))
+        n_league = matches // leagues + (1 if li < matches % leagues else 0)
+        # Matches spread evenly over the seasons, in date order
+        days = np.sort(rng.integers(SEASONS * 365, size=n_league))
+        for day in days:
+            season = FIRST_SEASON + int(day) // 365
+            date = str(np.datetime64(f"{season}-01-01") + int(day) % 365)
+            home, away = rng.choice(TEAMS_PER_LEAGUE, 2, replace=False)
+            xi = {team: rng.permutation(squads[season - FIRST_SEASON][li][team])[:11] for team in (home, away)}
+            team_names = {team: f"{label} Team {team + 1}" for team in (home, away)}
+            people = [p for team in (home, away) for p in xi[team]]
+            match = {
+                'meta': {'data_version': '1.1.0', 'created': date, 'revision': 1},
+                'info': {
+                    'dates': [date],
+                    'event': {'name': f"{label} {season}"},
+                    'gender': 'male',
+                    'match_type': 'T20I' if label == 'T20I' else 'T20',
+                    'overs': 20,
+                    'season': str(season),
+                    'teams': [team_names[home], team_names[away]],
+                    'players': {team_names[team]: [names[p] for p in xi[team]] for team in (home, away)},
+                    'registry': {'people': {names[p]: ids[p] for p in people}}
+                },
+                'innings': [
+                    {'team': team_names[bat], 'overs': innings_overs(rng, xi[bat], xi[bowl][6:], names)}
+                    for bat, bowl in ((home, away), (away, home))
+                ]
+            }
+            with open(os.path.join(folder, f"{match_id}.json"), 'w') as f:
+                json.dump(match, f)
+            match_id += 1
+    return folders
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic Cricsheet-format match JSON.")
+    parser.add_argument('root', help="Output directory (one <league>_male_json folder per league)")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help=f"Multiplies the default matches ({BASE_MATCHES}) and players ({BASE_PLAYERS})")
+    parser.add_argument('--matches', type=int, help="Number of matches (overrides --scale)")
+    parser.add_argument('--players', type=int, help="Size of the player pool (overrides --scale)")
+    parser.add_argument('--leagues', type=int, default=len(LEAGUES), help="Number of leagues")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    matches = args.matches or int(BASE_MATCHES * args.scale)
+    players = args.players or int(BASE_PLAYERS * args.scale)
+    folders = generate_corpus(args.root, matches, players, args.leagues, args.seed)
+    print(f"{matches} matches, {players} players across {len(folders)} leagues written to {args.root}")
+
+
+if __name__ == '__main__':
+    main()